@@ -0,0 +1,120 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import anyio
+from cachetools import TTLCache
+
+from app.ai.providers.base import AIProvider
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+class CompletionCache:
+    """Completions keyed on (provider, messages, lang).
+
+    Memory tier is an LRU with TTL. The optional SQLite tier survives restarts and is
+    shared by the workers on one host; hits there are copied back into memory.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, path: str | None = None):
+        self.ttl = ttl
+        self._mem: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, provider TEXT NOT NULL, reply TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(provider: str, messages: list[dict], lang: str) -> str:
+        normalized = [[m["role"], _normalize(m["content"])] for m in messages]
+        raw = json.dumps([provider, lang, normalized], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, key: str) -> tuple[str, str] | None:
+        hit = self._mem.get(key)
+        if hit is not None:
+            self.stats["hits"] += 1
+            return hit
+        if self._db is not None:
+            hit = await anyio.to_thread.run_sync(self._disk_get, key)
+            if hit is not None:
+                self.stats["disk_hits"] += 1
+                self._mem[key] = hit
+                return hit
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, provider: str, reply: str):
+        self._mem[key] = (provider, reply)
+        if self._db is not None:
+            await anyio.to_thread.run_sync(self._disk_set, key, provider, reply)
+
+    def _disk_get(self, key: str) -> tuple[str, str] | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT provider, reply FROM completions WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _disk_set(self, key: str, provider: str, reply: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, provider, reply, expires_at) VALUES (?, ?, ?, ?)",
+                (key, provider, reply, time.time() + self.ttl),
+            )
+            self._db.commit()
+
+    def info(self) -> dict:
+        return {**self.stats, "size": len(self._mem), "maxsize": self._mem.maxsize, "disk": self._db is not None}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class CachedProvider(AIProvider):
+    def __init__(self, inner: AIProvider, cache: CompletionCache):
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+        self.model = getattr(inner, "model", inner.name)
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        key = self.cache.key(self.inner.name, messages, lang)
+        hit = await self.cache.get(key)
+        if hit is not None:
+            # name stays whoever produced the cached reply, so Message.model is still right
+            self.name, reply = hit
+            return reply
+        reply = await self.inner.chat(messages, lang)
+        self.name = self.inner.name
+        await self.cache.set(key, self.name, reply)
+        return reply
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        key = self.cache.key(self.inner.name, messages, lang)
+        hit = await self.cache.get(key)
+        if hit is not None:
+            self.name, reply = hit
+            yield reply
+            return
+        parts = []
+        async for delta in self.inner.chat_stream(messages, lang):
+            parts.append(delta)
+            yield delta
+        self.name = self.inner.name
+        await self.cache.set(key, self.name, "".join(parts))
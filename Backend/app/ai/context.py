@@ -0,0 +1,63 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.models import Chat, ChatSegment, Lang, Message
+
+settings = get_settings()
+
+# per-message framing (role, separators) that every chat format adds on top of the text
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes of utf-8 per token holds up for english with bpe tokenizers, arabic is 2 bytes
+    # per letter and lands around 2 letters a token. good enough for budgeting, and no tokenizer to load
+    return len(text.encode("utf-8")) // 4 + MESSAGE_OVERHEAD
+
+
+def token_budget(model: str | None) -> int:
+    return settings.CONTEXT_TOKEN_BUDGETS.get(model or "", settings.CONTEXT_TOKEN_BUDGET)
+
+
+async def build_context(db: AsyncSession, chat: Chat | None, content: str, lang: Lang, model: str | None) -> list[dict]:
+    """System prompt + chat summary and segments + as many recent messages as fit the model's budget + the new message.
+
+    chat.summary has to be loaded already. Only messages after the last summarized one are sent
+    verbatim (see app/ai/summary_policy.py). History is read newest first with a LIMIT, so the cost
+    doesn't grow with the length of the chat.
+    """
+    system = {"role": "system", "content": "Answer in Arabic" if lang == Lang.ar else "Answer in English"}
+    head = [system]
+    covered = None
+    if chat and chat.summary:
+        head.append({"role": "assistant", "content": chat.summary.summary})
+        # None for a summary from before coverage was tracked, then it's summary + recent messages as it used to be
+        covered = chat.summary.covered_message_id
+    if covered is not None:
+        rows = await db.execute(
+            select(ChatSegment.summary, ChatSegment.last_message_id)
+            .where(ChatSegment.chat_id == chat.id, ChatSegment.last_message_id > covered)
+            .order_by(ChatSegment.last_message_id)
+        )
+        for text, last in rows:
+            head.append({"role": "assistant", "content": text})
+            covered = last
+    tail = {"role": "user", "content": content}
+
+    budget = token_budget(model) - sum(estimate_tokens(m["content"]) for m in (*head, tail))
+    recent: list[dict] = []
+    if chat and budget > 0:
+        q = select(Message.role, Message.content).where(Message.chat_id == chat.id)
+        if covered is not None:
+            q = q.where(Message.id > covered)
+        rows = await db.execute(q.order_by(Message.id.desc()).limit(settings.CONTEXT_MAX_MESSAGES))
+        for role, text in rows:
+            cost = estimate_tokens(text)
+            if cost > budget:
+                break
+            budget -= cost
+            recent.append({"role": role.value, "content": text})
+        recent.reverse()
+
+    return [*head, *recent, tail]
@@ -0,0 +1,71 @@
+import asyncio
+
+from app.ai.providers.base import AIProvider
+from app.core.metrics import LLM_IN_FLIGHT, LLM_WAITING
+
+
+class ProviderBusy(Exception):
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is at capacity")
+        self.provider = provider
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight calls to one vendor and how many callers may queue for a slot.
+
+    When the queue is full (or a caller waited too long) ProviderBusy is raised right
+    away, so slow LLM traffic turns into fast 503s instead of piling up.
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int, wait_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self._sem = asyncio.Semaphore(limit)
+        self._in_flight_gauge = LLM_IN_FLIGHT.labels(name)
+        self._waiting_gauge = LLM_WAITING.labels(name)
+
+    async def __aenter__(self):
+        if self._sem.locked():
+            if self.waiting >= self.max_waiting:
+                raise ProviderBusy(self.name)
+            self.waiting += 1
+            self._waiting_gauge.inc()
+            try:
+                await asyncio.wait_for(self._sem.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                raise ProviderBusy(self.name)
+            finally:
+                self.waiting -= 1
+                self._waiting_gauge.dec()
+        else:
+            await self._sem.acquire()
+        self.in_flight += 1
+        self._in_flight_gauge.inc()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._in_flight_gauge.dec()
+        self._sem.release()
+
+
+class LimitedProvider(AIProvider):
+    def __init__(self, inner: AIProvider, limiter: ConcurrencyLimiter):
+        self.inner = inner
+        self.limiter = limiter
+        self.name = inner.name
+        self.model = getattr(inner, "model", inner.name)
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        async with self.limiter:
+            return await self.inner.chat(messages, lang)
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        # the slot is held for the whole stream, not just until the first token
+        async with self.limiter:
+            async for delta in self.inner.chat_stream(messages, lang):
+                yield delta
@@ -0,0 +1,43 @@
+import time
+
+from app.ai.providers.base import AIProvider
+from app.core.metrics import LLM_ERRORS, LLM_FIRST_TOKEN, LLM_LATENCY
+
+
+class MeteredProvider(AIProvider):
+    """Times the vendor call itself. Sits inside LimitedProvider, so waiting for a slot isn't counted."""
+
+    def __init__(self, inner: AIProvider):
+        self.inner = inner
+        self.name = inner.name
+        self.model = getattr(inner, "model", inner.name)
+        self._chat = LLM_LATENCY.labels(self.name, self.model, "chat")
+        self._stream = LLM_LATENCY.labels(self.name, self.model, "stream")
+        self._first_token = LLM_FIRST_TOKEN.labels(self.name, self.model)
+
+    def _error(self, e: BaseException):
+        LLM_ERRORS.labels(self.name, self.model, type(e).__name__).inc()
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        start = time.perf_counter()
+        try:
+            reply = await self.inner.chat(messages, lang)
+        except Exception as e:
+            self._error(e)
+            raise
+        self._chat.observe(time.perf_counter() - start)
+        return reply
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        start = time.perf_counter()
+        first = True
+        try:
+            async for delta in self.inner.chat_stream(messages, lang):
+                if first:
+                    self._first_token.observe(time.perf_counter() - start)
+                    first = False
+                yield delta
+        except Exception as e:
+            self._error(e)
+            raise
+        self._stream.observe(time.perf_counter() - start)
@@ -0,0 +1,160 @@
+"""Batch refresh of the per-user profile summaries shown on /auth/profile.
+
+Runs periodically inside the app (PROFILE_SUMMARY_INTERVAL_SECONDS) or once from cron:
+
+    python -m app.ai.profile_summaries
+
+Every worker process runs the schedule, a lease in the database lets one of them do a round at a time.
+Each user a round picks is claimed with a lease too and skipped until that runs out, by every process.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import String, and_, cast, exists, func, literal, select, update
+from sqlalchemy.orm import aliased
+
+from app.ai.router import provider_from_name
+from app.ai.summarizer import summarize_user_profile
+from app.core.config import get_settings
+from app.db.lease import acquire, prune, release
+from app.db.models import Chat, ChatSummary, Lease, User, UserSummary
+from app.db.session import AsyncSessionLocal, async_engine
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ROUND_LEASE = "profile_summaries"
+USER_LEASE = "profile:"
+
+
+def stale_users_query(limit: int):
+    # users with a chat summary newer than their profile summary (in their preferred lang), or no profile summary yet.
+    # timestamps are compared in sql, both sides are written by the database clock. users claimed in this period are left out
+    us = aliased(UserSummary)
+    claimed = exists().where(
+        Lease.name == literal(USER_LEASE) + cast(User.id, String),
+        Lease.expires_at > datetime.now(timezone.utc),
+    )
+    return (
+        select(User.id, User.preferred_lang)
+        .join(Chat, Chat.user_id == User.id)
+        .join(ChatSummary, ChatSummary.chat_id == Chat.id)
+        .outerjoin(us, and_(us.user_id == User.id, us.lang == User.preferred_lang))
+        .where(~claimed)
+        .group_by(User.id, User.preferred_lang, us.updated_at)
+        .having((us.updated_at.is_(None)) | (func.max(ChatSummary.updated_at) > us.updated_at))
+        .limit(limit)
+    )
+
+
+async def load_chat_summaries(db, user_ids: list[int]) -> dict[int, list[str]]:
+    # one set-based query for the whole batch, latest chats first and capped per user
+    rows = await db.execute(
+        select(Chat.user_id, ChatSummary.summary)
+        .join(ChatSummary, ChatSummary.chat_id == Chat.id)
+        .where(Chat.user_id.in_(user_ids))
+        .order_by(Chat.user_id, Chat.id.desc())
+    )
+    out: dict[int, list[str]] = defaultdict(list)
+    for user_id, summary in rows:
+        if len(out[user_id]) < settings.PROFILE_SUMMARY_MAX_CHATS:
+            out[user_id].append(summary)
+    return out
+
+
+async def refresh_profile_summaries(batch_size: int | None = None, concurrency: int | None = None) -> int:
+    batch_size = batch_size or settings.PROFILE_SUMMARY_BATCH_SIZE
+    concurrency = concurrency or settings.PROFILE_SUMMARY_CONCURRENCY
+    prov_name = settings.PROFILE_SUMMARY_PROVIDER
+
+    async with AsyncSessionLocal() as db:
+        users = (await db.execute(stale_users_query(batch_size))).all()
+        # not released when done, a claim lasts the whole period
+        users = [u for u in users if await acquire(db, f"{USER_LEASE}{u.id}", settings.PROFILE_SUMMARY_LEASE_SECONDS)]
+        if not users:
+            return 0
+        summaries = await load_chat_summaries(db, [u.id for u in users])
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(user_id: int, lang: str) -> tuple[int, str, str | None]:
+        async with sem:
+            prov = provider_from_name(prov_name)
+            if not prov:
+                return user_id, lang, None
+            try:
+                # summaries were listed newest first, the prompt reads better in chat order
+                return user_id, lang, await summarize_user_profile(prov, summaries[user_id][::-1], lang)
+            except Exception:
+                logger.exception("profile summary failed for user %s", user_id)
+                return user_id, lang, None
+
+    results = await asyncio.gather(*(one(u.id, u.preferred_lang.value) for u in users))
+
+    done = 0
+    async with AsyncSessionLocal() as db:
+        for user_id, lang, text in results:
+            if text is None:
+                continue
+            updated = await db.execute(
+                update(UserSummary)
+                .where(UserSummary.user_id == user_id, UserSummary.lang == lang)
+                # updated_at set explicitly: an unchanged summary must still count as fresh
+                .values(summary=text, updated_at=func.now())
+            )
+            if updated.rowcount == 0:
+                db.add(UserSummary(user_id=user_id, lang=lang, summary=text))
+            done += 1
+        await db.commit()
+    return done
+
+
+async def refresh_round() -> int | None:
+    """Refreshes batches until one comes back short. None when another process holds the round."""
+    total = 0
+    async with AsyncSessionLocal() as db:
+        await prune(db, USER_LEASE)
+    while True:
+        async with AsyncSessionLocal() as db:
+            # taken again before every batch, which extends it for a long round
+            if not await acquire(db, ROUND_LEASE, settings.PROFILE_SUMMARY_LEASE_SECONDS):
+                # only the first batch refreshes nothing, later ones run after a full batch
+                return total or None
+        n = await refresh_profile_summaries()
+        total += n
+        if n < settings.PROFILE_SUMMARY_BATCH_SIZE:
+            return total
+
+
+async def run_periodically(interval: float):
+    while True:
+        try:
+            # the round lease is kept until it runs out, so the other processes skip this interval
+            await refresh_round()
+        except Exception:
+            logger.exception("profile summary batch failed")
+        await asyncio.sleep(interval)
+
+
+async def _main():
+    from app.ai.registry import close_registry
+
+    try:
+        try:
+            total = await refresh_round()
+        finally:
+            async with AsyncSessionLocal() as db:
+                await release(db, ROUND_LEASE)
+    finally:
+        await close_registry()
+        await async_engine.dispose()
+    if total is None:
+        print("another process is refreshing profile summaries, skipped")
+    else:
+        print(f"refreshed {total} profile summaries")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
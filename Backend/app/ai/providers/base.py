@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
 
 class AIProvider(ABC):
     name: str
 
     @abstractmethod
     async def chat(self, messages: list[dict], lang: str) -> str: ...
+
+    async def chat_stream(self, messages: list[dict], lang: str) -> AsyncIterator[str]:
+        # providers that can't stream just hand back the whole completion as one chunk
+        yield await self.chat(messages, lang)
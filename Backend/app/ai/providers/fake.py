@@ -0,0 +1,57 @@
+import asyncio
+import hashlib
+import random
+
+from app.ai.providers.base import AIProvider
+
+_WORDS = ("the", "a", "star", "light", "model", "answer", "space", "time", "data", "chat",
+          "quick", "fox", "query", "token", "cloud", "river", "stone", "signal", "energy", "path")
+
+
+class FakeProviderError(RuntimeError):
+    pass
+
+
+class FakeProvider(AIProvider):
+    """Local stand-in for load tests, no network and no quota.
+
+    Latency is lognormal around `latency_ms` (median) with spread `sigma`, the reply is
+    streamed at `tokens_per_second` (0 = all at once) and `failure_rate` of the calls raise.
+    Seeded, and the reply text only depends on the prompt, so runs are repeatable.
+    """
+
+    def __init__(self, name: str = "fake", model: str = "fake", latency_ms: float = 300, sigma: float = 0.5,
+                 tokens_per_second: float = 0, reply_tokens: int = 60, failure_rate: float = 0, seed: int = 0):
+        self.name = name
+        self.model = model
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+
+    def _reply_words(self, messages: list[dict]) -> list[str]:
+        digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+        return [_WORDS[digest[i % len(digest)] % len(_WORDS)] for i in range(self.reply_tokens)]
+
+    async def _first_token_delay(self):
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            await asyncio.sleep(self.latency_ms / 1000 / 2)
+            raise FakeProviderError(f"{self.name} failed (simulated)")
+        if self.latency_ms > 0:
+            await asyncio.sleep(self._rng.lognormvariate(0, self.sigma) * self.latency_ms / 1000)
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        await self._first_token_delay()
+        words = self._reply_words(messages)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(words) / self.tokens_per_second)
+        return " ".join(words)
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        await self._first_token_delay()
+        for i, word in enumerate(self._reply_words(messages)):
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield word if i == 0 else " " + word
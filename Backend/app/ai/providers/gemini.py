@@ -1,6 +1,5 @@
 import google.generativeai as genai
 from app.ai.providers.base import AIProvider
-import anyio
 
 
 class GeminiProvider(AIProvider):
@@ -8,12 +7,25 @@ class GeminiProvider(AIProvider):
         self.model = model
         self.name = name
         genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model)
 
     async def chat(self, messages: list[dict], lang: str) -> str:
-        return await anyio.to_thread.run_sync(self._chat_sync, messages)
-
-    def _chat_sync(self, messages: list[dict]) -> str:
-        prompt = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-        model = genai.GenerativeModel(self.model)
-        response = model.generate_content(prompt)
+        response = await self._model.generate_content_async(self._prompt(messages))
         return response.text
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        response = await self._model.generate_content_async(self._prompt(messages), stream=True)
+        async for chunk in response:
+            text = self._chunk_text(chunk)
+            if text:
+                yield text
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        # chunk.text raises ValueError on chunks without parts (the last one, safety blocks), read the parts instead
+        if not chunk.candidates:
+            return ""
+        return "".join(part.text for part in chunk.candidates[0].content.parts)
+
+    def _prompt(self, messages: list[dict]) -> str:
+        return "\n".join([f"{m['role']}: {m['content']}" for m in messages])
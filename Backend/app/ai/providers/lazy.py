@@ -0,0 +1,41 @@
+import asyncio
+import importlib
+
+import anyio
+
+from app.ai.providers.base import AIProvider
+
+
+class LazyProvider(AIProvider):
+    """Stands in for a vendor provider until its first call.
+
+    The vendor SDKs (grpc/protobuf for gemini, groq, mistralai) take most of the app's import
+    time, so they are imported on first use, on a worker thread so the event loop keeps serving.
+    """
+
+    def __init__(self, path: str, name: str, model: str, **kwargs):
+        # path is "module:Class", the class gets model/name plus kwargs
+        self.name = name
+        self.model = model
+        self._path = path
+        self._kwargs = kwargs
+        self._inner: AIProvider | None = None
+        self._lock = asyncio.Lock()
+
+    def _build(self) -> AIProvider:
+        module, _, cls = self._path.partition(":")
+        return getattr(importlib.import_module(module), cls)(model=self.model, name=self.name, **self._kwargs)
+
+    async def load(self) -> AIProvider:
+        if self._inner is None:
+            async with self._lock:
+                if self._inner is None:
+                    self._inner = await anyio.to_thread.run_sync(self._build)
+        return self._inner
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        return await (await self.load()).chat(messages, lang)
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        async for delta in (await self.load()).chat_stream(messages, lang):
+            yield delta
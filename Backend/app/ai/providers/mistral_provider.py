@@ -1,22 +1,31 @@
 from mistralai import Mistral
 from app.ai.providers.base import AIProvider
-import anyio
 
 
 class MistralProvider(AIProvider):
-    def __init__(self, api_key: str, model: str = "mistral-small-latest", name: str = "mistral"):
-        self.client = Mistral(api_key=api_key)
+    def __init__(self, api_key: str, model: str = "mistral-small-latest", name: str = "mistral", http_client=None):
+        self.client = Mistral(api_key=api_key, async_client=http_client)
         self.model = model
         self.name = name
 
     async def chat(self, messages: list[dict], lang: str) -> str:
-        return await anyio.to_thread.run_sync(self._chat_sync, messages)
+        response = await self.client.chat.complete_async(
+            model=self.model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=512,
+        )
+        return response.choices[0].message.content
 
-    def _chat_sync(self, messages: list[dict]) -> str:
-        response = self.client.chat.complete(
+    async def chat_stream(self, messages: list[dict], lang: str):
+        stream = await self.client.chat.stream_async(
             model=self.model,
             messages=messages,
             temperature=0.7,
             max_tokens=512,
         )
-        return response.choices[0].message.content
\ No newline at end of file
+        async with stream as events:
+            async for event in events:
+                choices = event.data.choices
+                if choices and choices[0].delta.content:
+                    yield choices[0].delta.content
@@ -0,0 +1,151 @@
+import httpx
+
+from app.ai.cache import CachedProvider, CompletionCache
+from app.ai.limits import ConcurrencyLimiter, LimitedProvider
+from app.ai.metered import MeteredProvider
+from app.ai.providers.base import AIProvider
+from app.ai.routing import ProviderHealth, RoutedProvider
+from app.ai.providers.fake import FakeProvider
+from app.ai.providers.lazy import LazyProvider
+from app.core.config import Settings, get_settings
+
+
+class ProviderRegistry:
+    """Providers built once per process, looked up by vendor name or by model id.
+
+    The first model configured for a vendor is also registered under the vendor
+    name ("gemini", "groq", "mistral"), which is what Message.model stores.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.providers: dict[str, AIProvider] = {}
+        self.order = settings.PROVIDER_ORDER
+        self.limiters: dict[str, ConcurrencyLimiter] = {}
+        self.health: dict[str, ProviderHealth] = {}
+        self.vendors: list[str] = []
+        self._http_clients: list[httpx.AsyncClient] = []
+        self.cache = CompletionCache(
+            maxsize=settings.COMPLETION_CACHE_SIZE,
+            ttl=settings.COMPLETION_CACHE_TTL_SECONDS,
+            path=settings.COMPLETION_CACHE_PATH,
+        ) if settings.COMPLETION_CACHE_ENABLED else None
+
+        # vendor sdks are only imported once a provider is first called (see LazyProvider)
+        if settings.GEMINI_API_KEY:
+            self._add("gemini", settings.GEMINI_MODELS, lambda model, name: LazyProvider(
+                "app.ai.providers.gemini:GeminiProvider", name, model, api_key=settings.GEMINI_API_KEY))
+        if settings.Mistral_API_KEY:
+            client = self._http_client()
+            self._add("mistral", settings.MISTRAL_MODELS, lambda model, name: LazyProvider(
+                "app.ai.providers.mistral_provider:MistralProvider", name, model,
+                api_key=settings.Mistral_API_KEY, http_client=client))
+        if settings.GROQ_API_KEY:
+            client = self._http_client()
+            self._add("groq", settings.GROQ_MODELS, lambda model, name: LazyProvider(
+                "app.ai.providers.groq:GroqProvider", name, model, api_key=settings.GROQ_API_KEY, http_client=client))
+        if settings.FAKE_PROVIDER_ENABLED:
+            self._add("fake", settings.FAKE_MODELS, lambda model, name: FakeProvider(
+                name=name, model=model, latency_ms=settings.FAKE_LATENCY_MS, sigma=settings.FAKE_LATENCY_SIGMA,
+                tokens_per_second=settings.FAKE_TOKENS_PER_SECOND, reply_tokens=settings.FAKE_REPLY_TOKENS,
+                failure_rate=settings.FAKE_FAILURE_RATE, seed=settings.FAKE_SEED,
+            ))
+
+    def _http_client(self) -> httpx.AsyncClient:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.settings.PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=self.settings.PROVIDER_MAX_KEEPALIVE,
+            ),
+            timeout=self.settings.PROVIDER_TIMEOUT_SECONDS,
+        )
+        self._http_clients.append(client)
+        return client
+
+    def _add(self, vendor: str, models: list[str], build):
+        # one limiter per vendor, the models of a vendor share its api key and rate limits
+        limiter = ConcurrencyLimiter(
+            vendor,
+            self.settings.PROVIDER_CONCURRENCY.get(vendor, 16),
+            self.settings.PROVIDER_MAX_QUEUE,
+            self.settings.PROVIDER_QUEUE_TIMEOUT_SECONDS,
+        )
+        self.limiters[vendor] = limiter
+        self.vendors.append(vendor)
+        for i, model in enumerate(models):
+            prov = build(model, vendor if i == 0 else model)
+            if self.settings.METRICS_ENABLED:
+                prov = MeteredProvider(prov)
+            prov = LimitedProvider(prov, limiter)
+            self.health[prov.name] = ProviderHealth(
+                alpha=self.settings.ROUTER_EWMA_ALPHA,
+                failure_threshold=self.settings.ROUTER_CIRCUIT_FAILURES,
+                open_seconds=self.settings.ROUTER_CIRCUIT_OPEN_SECONDS,
+            )
+            self.providers[model] = prov
+            if i == 0:
+                self.providers[vendor] = prov
+
+    def get(self, name: str | None) -> AIProvider | None:
+        if name and name in self.providers:
+            return self.providers[name]
+        for k in self.order:
+            if k in self.providers:
+                return self.providers[k]
+        return None
+
+    def candidates(self, name: str | None) -> list[AIProvider]:
+        # the pinned provider (if any) first, then one provider per vendor: measured ones by
+        # latency weighted with their error rate, unmeasured ones in PROVIDER_ORDER, open breakers last
+        order = [v for v in self.order if v in self.vendors] + [v for v in self.vendors if v not in self.order]
+
+        def rank(vendor: str):
+            h = self.health[self.providers[vendor].name]
+            measured = h.latency is not None
+            return (h.is_open, not measured, h.latency * (1 + h.error_rate) if measured else order.index(vendor))
+
+        pool = [self.providers[v] for v in sorted(order, key=rank)]
+        pinned = self.providers.get(name) if name else None
+        if pinned:
+            pool = [pinned] + [p for p in pool if p is not pinned]
+        if not self.settings.ROUTER_FAILOVER:
+            pool = pool[:1]
+        return pool
+
+    def route(self, name: str | None, cache: bool = True) -> AIProvider | None:
+        candidates = self.candidates(name)
+        if not candidates:
+            return None
+        pinned = bool(name) and name in self.providers
+        hedge = self.settings.ROUTER_HEDGE and not pinned
+        prov = RoutedProvider(candidates, self.health, self.settings.ROUTER_HEDGE_MIN_DELAY_SECONDS if hedge else None)
+        if cache and self.cache is not None:
+            prov = CachedProvider(prov, self.cache)
+        return prov
+
+    def names(self) -> list[str]:
+        return list(self.providers)
+
+    async def aclose(self):
+        for client in self._http_clients:
+            await client.aclose()
+        self._http_clients = []
+        if self.cache is not None:
+            self.cache.close()
+
+
+_registry: ProviderRegistry | None = None
+
+
+def get_registry() -> ProviderRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ProviderRegistry(get_settings())
+    return _registry
+
+
+async def close_registry():
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
@@ -1,37 +1,22 @@
 from fastapi import APIRouter
-from app.core.config import get_settings
-from app.ai.providers.gemini import GeminiProvider
-from app.ai.providers.groq import GroqProvider
-from app.ai.providers.groq import GroqProvider
-from app.ai.providers.mistral_provider import MistralProvider
+from app.ai.registry import get_registry
 
 router = APIRouter(prefix="/ai", tags=["ai"])
-settings = get_settings()
-
-
-def provider_from_name(name: str | None):
-    available = {}
-
-    if settings.Mistral_API_KEY:
-        available["mistral"] = MistralProvider(settings.Mistral_API_KEY)
-
-    if settings.GROQ_API_KEY:
-        available["groq"] = GroqProvider(settings.GROQ_API_KEY)
-
-    if settings.GEMINI_API_KEY:
-        available["gemini"] = GeminiProvider(settings.GEMINI_API_KEY)
-
-    if name and name in available:
-        return available[name]
-
-    for k in ["gemini","mistral", "groq"]:
-        if k in available:
-            return available[k]
-
-    return None
 
 
+def provider_from_name(name: str | None, cache: bool = True):
+    # name can be a vendor ("gemini") or a model id ("gemini-2.5-flash"), unknown names get the healthiest vendor.
+    # the returned provider fails over between vendors, its .name is whoever answered the last call.
+    # cache=False skips the completion cache for this call
+    return get_registry().route(name, cache=cache)
 
 
+@router.get("/models")
+def list_models():
+    return {"models": get_registry().names()}
 
 
+@router.get("/cache")
+def cache_stats():
+    cache = get_registry().cache
+    return cache.info() if cache else {"enabled": False}
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import deque
+
+from app.ai.limits import ProviderBusy
+from app.ai.providers.base import AIProvider
+
+
+class ProviderHealth:
+    """EWMA latency / error rate plus a simple circuit breaker for one provider."""
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 5, open_seconds: float = 30.0):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.latency: float | None = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self._samples: deque[float] = deque(maxlen=200)
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.open_seconds:
+            # half-open: let this one call through and re-arm the window for everybody else,
+            # its outcome decides whether the breaker closes again
+            self.opened_at = now
+            return True
+        return False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def record_success(self, elapsed: float):
+        self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self._samples.append(elapsed)
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def p95(self) -> float | None:
+        if len(self._samples) < 20:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class RoutedProvider(AIProvider):
+    """Tries the candidates in order and fails over to the next one on errors.
+
+    Built per request: after a call, `name` is the provider that actually answered,
+    so callers can keep storing prov.name in Message.model.
+    """
+
+    def __init__(self, candidates: list[AIProvider], health: dict[str, ProviderHealth],
+                 hedge_delay: float | None = None):
+        self.candidates = candidates
+        self.health = health
+        self.hedge_delay = hedge_delay
+        self.name = candidates[0].name
+        self.model = getattr(candidates[0], "model", self.name)
+
+    async def _call(self, prov: AIProvider, messages: list[dict], lang: str) -> tuple[AIProvider, str]:
+        health = self.health[prov.name]
+        start = time.perf_counter()
+        try:
+            reply = await prov.chat(messages, lang)
+        except ProviderBusy:
+            # load, not a health problem: move on without tripping the breaker
+            raise
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.perf_counter() - start)
+        return prov, reply
+
+    def _usable(self):
+        # lazily, so half-open breakers only let a trial through when we really get to them
+        tried = False
+        for prov in self.candidates:
+            if self.health[prov.name].allow():
+                tried = True
+                yield prov
+        if not tried:
+            # every breaker is open: still give the first choice a go rather than failing outright
+            yield self.candidates[0]
+
+    def _answered_by(self, prov: AIProvider):
+        self.name = prov.name
+        self.model = getattr(prov, "model", prov.name)
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        usable = self._usable()
+        last_exc: Exception | None = None
+
+        if self.hedge_delay is not None:
+            primary, secondary = next(usable), next(usable, None)
+            try:
+                if secondary is None:
+                    prov, reply = await self._call(primary, messages, lang)
+                else:
+                    prov, reply = await self._hedged(primary, secondary, messages, lang)
+                self._answered_by(prov)
+                return reply
+            except Exception as e:
+                last_exc = e
+
+        for prov in usable:
+            try:
+                prov, reply = await self._call(prov, messages, lang)
+                self._answered_by(prov)
+                return reply
+            except Exception as e:
+                last_exc = e
+        raise last_exc
+
+    async def _hedged(self, primary: AIProvider, secondary: AIProvider, messages: list[dict], lang: str):
+        delay = self.health[primary.name].p95() or self.hedge_delay
+        first = asyncio.create_task(self._call(primary, messages, lang))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=max(delay, self.hedge_delay))
+            if done and not first.exception():
+                return first.result()
+
+            # primary is slow (or already failed): race a second request against it
+            tasks.append(asyncio.create_task(self._call(secondary, messages, lang)))
+            pending = {t for t in tasks if not t.done()}
+            last_exc = first.exception() if done else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_exc = task.exception()
+            raise last_exc
+        finally:
+            # the loser, or both when the caller is cancelled: stop them and collect their outcome, so they
+            # neither hold provider slots nor log "Task exception was never retrieved"
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def chat_stream(self, messages: list[dict], lang: str):
+        # failover only makes sense before the first token went out
+        last_exc: Exception | None = None
+        for prov in self._usable():
+            health = self.health[prov.name]
+            start = time.perf_counter()
+            stream = prov.chat_stream(messages, lang)
+            try:
+                first = await anext(stream)
+            except StopAsyncIteration:
+                first = None
+            except ProviderBusy as e:
+                last_exc = e
+                continue
+            except Exception as e:
+                health.record_failure()
+                last_exc = e
+                continue
+
+            self._answered_by(prov)
+            try:
+                if first is not None:
+                    yield first
+                async for delta in stream:
+                    yield delta
+            except Exception:
+                health.record_failure()
+                raise
+            finally:
+                await stream.aclose()
+            health.record_success(time.perf_counter() - start)
+            return
+        raise last_exc
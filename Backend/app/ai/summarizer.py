@@ -1,6 +1,4 @@
 from app.ai.providers.base import AIProvider
-from datetime import datetime, timedelta
-from app.db.models import UserSummary
 
 
 SYSTEM_EN = "You are an assistant that creates concise user profile summaries."
@@ -26,39 +24,33 @@ async def summarize_history(provider: AIProvider, history: list[dict], lang: str
     return await provider.chat(messages, lang)
 
 
-async def update_chat_summary(prov, chat, db, lang: str, user_msg: str, assistant_msg: str):
-    old_summary = chat.summary.summary if chat.summary else ""
-    system = "أنت مساعد يحدّث ملخص المحادثة." if lang == "ar" else "You are an assistant that updates a chat summary."
+async def summarize_segment(prov, lang: str, previous: str | None, messages: list[tuple[str, str]]) -> str:
+    # messages are (role, content) of one stretch of the chat, previous summarizes what came before it
+    system = "أنت مساعد يلخص جزءاً من محادثة." if lang == "ar" else "You are an assistant that summarizes part of a conversation."
+    turns = "\n\n".join(f"{'The user' if role == 'user' else 'The assistant'} said:\n{content}" for role, content in messages)
+    before = f"What came before, for context only:\n\n{previous}\n\n" if previous else ""
     user_prompt = (
-        f"Here is the current summary:\n\n{old_summary}\n\n"
-        f"Now the user said:\n{user_msg}\n\n"
-        f"And the assistant replied:\n{assistant_msg}\n\n"
-        "Please update the summary so it remains short, meaningful, and reflects the new exchange."
+        f"{before}The conversation continued:\n\n{turns}\n\n"
+        "Summarize this part of the conversation in a few sentences. Keep names, numbers, decisions and open questions."
     )
-
     convo = [{"role": "system", "content": system}, {"role": "user", "content": user_prompt}]
-    new_summary = await prov.chat(convo, lang)
-
-    if chat.summary:
-        chat.summary.summary = new_summary
-    else:
-        from app.db.models import ChatSummary
-        db.add(ChatSummary(chat_id=chat.id, lang=lang, summary=new_summary))
-    db.commit()
+    return await prov.chat(convo, lang)
 
-    return new_summary
 
+async def fold_summaries(prov, lang: str, summary: str, segments: list[str]) -> str:
+    # segments are summaries of the parts of the chat after `summary`, oldest first
+    system = "أنت مساعد يحدّث ملخص المحادثة." if lang == "ar" else "You are an assistant that updates a chat summary."
+    parts = "\n\n".join(f"Part {i}:\n{text}" for i, text in enumerate(segments, 1))
+    user_prompt = (
+        f"Here is the current summary:\n\n{summary}\n\n"
+        f"Since then, in parts:\n\n{parts}\n\n"
+        "Merge them into one updated summary. Keep it short and keep the facts that still matter."
+    )
+    convo = [{"role": "system", "content": system}, {"role": "user", "content": user_prompt}]
+    return await prov.chat(convo, lang)
 
 
-async def refresh_user_summary(prov, user, db, lang: str):
-    existing = db.query(UserSummary).filter(UserSummary.user_id == user.id, UserSummary.lang == lang).first()
-    if existing and existing.updated_at > datetime.utcnow() - timedelta(days=1):
-        return existing.summary
-
-    chat_summaries = [c.summary.summary for c in user.chats if c.summary]
-    if not chat_summaries:
-        return None
-
+async def summarize_user_profile(prov, chat_summaries: list[str], lang: str) -> str:
     system = "أنت مساعد يلخص اهتمامات المستخدم." if lang == "ar" else "You are an assistant that summarizes the user's main interests."
     user_prompt = (
         "بناءً على ملخصات المحادثات التالية، لخّص أهم اهتمامات هذا المستخدم ومواضيعه المتكررة."
@@ -70,13 +62,4 @@ async def refresh_user_summary(prov, user, db, lang: str):
     convo.extend([{"role": "assistant", "content": s} for s in chat_summaries])
     convo.append({"role": "user", "content": user_prompt})
 
-    summary_text = await prov.chat(convo, lang)
-
-    if existing:
-        existing.summary = summary_text
-    else:
-        db.add(UserSummary(user_id=user.id, lang=lang, summary=summary_text))
-    db.commit()
-
-    return summary_text
-
+    return await prov.chat(convo, lang)
@@ -0,0 +1,106 @@
+"""When chat summaries are written and what each one covers.
+
+Rewriting the summary after every exchange costs a summarizer call per turn, and the summary drifts
+because all of it is rewritten each time. Instead:
+
+- messages after the last summarized one are left alone until they add up to SUMMARY_TRIGGER_TOKENS
+- then all but the newest SUMMARY_KEEP_TOKENS of them are summarized into a segment. The first one
+  of a chat becomes the chat summary directly
+- once more than SUMMARY_MAX_SEGMENTS segments have piled up, all but the newest are folded into
+  the chat summary
+
+Summaries and segments record the last message id they cover. build_context sends the chat summary,
+the segments after it and only the messages after those, so nothing goes to the model twice.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai.context import estimate_tokens
+from app.ai.summarizer import fold_summaries, summarize_segment
+from app.core.config import get_settings
+from app.core.metrics import SUMMARY_CALLS
+from app.db.models import Chat, ChatSegment, ChatSummary, Lang, Message, Role
+
+settings = get_settings()
+
+
+def split_point(tail: list[tuple[Role, int]]) -> int:
+    """How many of the oldest unsummarized messages to summarize now, 0 for none. tail is (role, tokens), oldest first."""
+    if sum(tokens for _, tokens in tail) < settings.SUMMARY_TRIGGER_TOKENS:
+        return 0
+    n, kept = len(tail), 0
+    while n > 0 and kept + tail[n - 1][1] <= settings.SUMMARY_KEEP_TOKENS:
+        n -= 1
+        kept += tail[n][1]
+    # don't split an exchange, what stays verbatim starts with a user message
+    while 0 < n < len(tail) and tail[n][0] != Role.user:
+        n -= 1
+    return n
+
+
+async def covered_message_id(db: AsyncSession, summary: ChatSummary) -> int:
+    if summary.covered_message_id is None:
+        # written by the old update after every exchange, so it covered the whole chat as of its last write
+        written = select(ChatSummary.updated_at).where(ChatSummary.id == summary.id).scalar_subquery()
+        summary.covered_message_id = await db.scalar(
+            select(func.coalesce(func.max(Message.id), 0))
+            .where(Message.chat_id == summary.chat_id, Message.created_at <= written)
+        )
+    return summary.covered_message_id
+
+
+async def summarize_chat(db: AsyncSession, chat: Chat, prov, lang: Lang) -> int:
+    """Applies the policy to one chat and returns the number of summarizer calls it took.
+
+    chat.summary has to be loaded already, the caller commits.
+    """
+    summary = chat.summary
+    covered = await covered_message_id(db, summary) if summary else 0
+    segments = list((await db.scalars(
+        select(ChatSegment).where(ChatSegment.chat_id == chat.id).order_by(ChatSegment.last_message_id)
+    )).all())
+    if segments:
+        covered = max(covered, segments[-1].last_message_id)
+
+    # build_context never reads further back than CONTEXT_MAX_MESSAGES, neither do we
+    rows = (await db.execute(
+        select(Message.id, Message.role, Message.content)
+        .where(Message.chat_id == chat.id, Message.id > covered)
+        .order_by(Message.id.desc())
+        .limit(settings.CONTEXT_MAX_MESSAGES)
+    )).all()
+    rows.reverse()
+    tail = [(role, estimate_tokens(content)) for _, role, content in rows]
+    n = split_point(tail)
+    if not n:
+        return 0
+
+    # one call sees at most a context budget worth of messages. only a backlog (an old chat getting its
+    # first summary) is longer than that, its oldest messages are skipped
+    start, budget = n - 1, settings.CONTEXT_TOKEN_BUDGET - tail[n - 1][1]
+    while start > 0 and tail[start - 1][1] <= budget:
+        start -= 1
+        budget -= tail[start][1]
+    part = rows[start:n]
+    previous = segments[-1].summary if segments else summary.summary if summary else None
+    text = await summarize_segment(prov, lang.value, previous, [(role.value, content) for _, role, content in part])
+    SUMMARY_CALLS.labels("segment").inc()
+
+    if summary is None:
+        db.add(ChatSummary(chat_id=chat.id, lang=lang, summary=text, covered_message_id=part[-1].id))
+        return 1
+    segment = ChatSegment(chat_id=chat.id, first_message_id=part[0].id, last_message_id=part[-1].id, lang=lang,
+                          summary=text)
+    db.add(segment)
+    segments.append(segment)
+    if len(segments) <= settings.SUMMARY_MAX_SEGMENTS:
+        return 1
+
+    folded = segments[:-1]
+    summary.summary = await fold_summaries(prov, lang.value, summary.summary, [s.summary for s in folded])
+    SUMMARY_CALLS.labels("fold").inc()
+    summary.lang = lang
+    summary.covered_message_id = folded[-1].last_message_id
+    for s in folded:
+        await db.delete(s)
+    return 2
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+
+from sqlalchemy import delete, distinct, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.ai.router import provider_from_name
+from app.ai.summary_policy import summarize_chat
+from app.core.config import get_settings
+from app.core.metrics import SUMMARY_JOB_LATENCY
+from app.db.lease import acquire, release
+from app.db.models import Chat, SummaryJob, Lang
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def enqueue_summary(db: AsyncSession, chat_id: int, lang: Lang, model: str | None):
+    # added to the caller's transaction, the worker is only told about it once that commits
+    db.add(SummaryJob(chat_id=chat_id, lang=lang, model=model))
+
+
+class SummaryWorker:
+    """Keeps chat summaries up to date off the request path.
+
+    A job only says that a chat has new messages. Whether that calls the summarizer is up to
+    app/ai/summary_policy.py, and jobs for the same chat that pile up while the worker is busy
+    (or during the debounce window) are handled in one run.
+
+    Every process runs one and each notifies the chats with jobs on start. A run claims its chat with a
+    lease first, so two processes never summarize the same messages; the one that lost looks again later.
+    """
+
+    def __init__(self, concurrency: int = 2, debounce: float = 2.0, retry_delay: float = 30.0):
+        self.concurrency = concurrency
+        self.debounce = debounce
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._queued: set[int] = set()
+        self._running: set[int] = set()
+        self._dirty: set[int] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def notify(self, chat_id: int):
+        if chat_id in self._running:
+            # picked up again once the current run for this chat is done
+            self._dirty.add(chat_id)
+        elif chat_id not in self._queued:
+            # debounced from this first notify, the ones that follow within the window join the same run.
+            # the timer puts it on the queue, so consumers never wait out one chat's window after another
+            self._queued.add(chat_id)
+            asyncio.get_running_loop().call_later(self.debounce, self._queue.put_nowait, chat_id)
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            for chat_id in (await db.scalars(select(distinct(SummaryJob.chat_id)))).all():
+                self.notify(chat_id)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _consume(self):
+        while True:
+            chat_id = await self._queue.get()
+            self._queued.discard(chat_id)
+            self._running.add(chat_id)
+            try:
+                with SUMMARY_JOB_LATENCY.time():
+                    await self.process(chat_id)
+            except Exception:
+                # jobs stay in the table, try again later (e.g. the provider was busy)
+                logger.exception("summary update failed for chat %s", chat_id)
+                asyncio.get_running_loop().call_later(self.retry_delay, self.notify, chat_id)
+            finally:
+                self._running.discard(chat_id)
+                if chat_id in self._dirty:
+                    self._dirty.discard(chat_id)
+                    self.notify(chat_id)
+
+    async def process(self, chat_id: int) -> int:
+        # returns the number of summarizer calls
+        lease = f"summary:{chat_id}"
+        async with AsyncSessionLocal() as db:
+            if not await acquire(db, lease, settings.SUMMARY_LEASE_SECONDS):
+                # another process is on this chat, the jobs it didn't see are picked up next time
+                asyncio.get_running_loop().call_later(self.retry_delay, self.notify, chat_id)
+                return 0
+        try:
+            return await self._summarize(chat_id)
+        finally:
+            async with AsyncSessionLocal() as db:
+                await release(db, lease)
+
+    async def _summarize(self, chat_id: int) -> int:
+        async with AsyncSessionLocal() as db:
+            latest = await db.scalar(
+                select(SummaryJob).where(SummaryJob.chat_id == chat_id).order_by(SummaryJob.id.desc()).limit(1)
+            )
+            if not latest:
+                return 0
+            chat = await db.scalar(select(Chat).options(selectinload(Chat.summary)).where(Chat.id == chat_id))
+            prov = provider_from_name(latest.model)
+            if not chat or not prov:
+                return 0
+
+            calls = await summarize_chat(db, chat, prov, latest.lang)
+            # one commit, so the jobs only go away if the summaries are stored
+            await db.execute(delete(SummaryJob).where(SummaryJob.chat_id == chat_id, SummaryJob.id <= latest.id))
+            await db.commit()
+            return calls
+
+
+summary_worker = SummaryWorker(
+    concurrency=settings.SUMMARY_WORKER_CONCURRENCY,
+    debounce=settings.SUMMARY_DEBOUNCE_SECONDS,
+)
@@ -0,0 +1,64 @@
+import time
+from dataclasses import dataclass
+
+from cachetools import TTLCache
+from sqlalchemy import event
+
+from app.core.config import get_settings
+from app.db.models import Lang, User
+
+settings = get_settings()
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    # what most endpoints need from the authenticated user, without loading the User row
+    id: int
+    email: str
+    preferred_lang: Lang
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, email=user.email, preferred_lang=user.preferred_lang)
+
+
+class PrincipalCache:
+    """Verified token -> Principal, bounded and short-lived.
+
+    Entries never outlive the token's own exp. Updating or deleting a User drops its
+    entries in this process (see the mapper events below); other workers pick the
+    change up once the TTL runs out.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, token: str) -> Principal | None:
+        hit = self._entries.get(token)
+        if hit is None:
+            return None
+        principal, exp = hit
+        if exp is not None and exp <= time.time():
+            self._entries.pop(token, None)
+            return None
+        return principal
+
+    def put(self, token: str, principal: Principal, exp: float | None):
+        self._entries[token] = (principal, exp)
+
+    def invalidate_user(self, user_id: int):
+        for token, (principal, _) in list(self._entries.items()):
+            if principal.id == user_id:
+                self._entries.pop(token, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, target: User):
+    principal_cache.invalidate_user(target.id)
@@ -2,35 +2,40 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.auth.schemas import SignupIn, LoginIn, TokenOut
 from app.db.models import User
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import password_pool, create_access_token
 from app.core.i18n import t
-from app.ai.summarizer import refresh_user_summary
 from fastapi import Depends
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.deps import get_db, get_current_user
-from app.db.models import Chat, Message
-from app.ai.router import provider_from_name
-from app.deps import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import get_async_db, get_current_user_async
+from app.db.models import UserStat, UserModelStat, UserSummary
+from app.db.stats import rebuild as rebuild_stats
 from .schemas import ProfileResponse, UserProfile, UserStats
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/signup", response_model=TokenOut)
-def signup(data: SignupIn, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email==data.email).first():
+async def signup(data: SignupIn, db: AsyncSession = Depends(get_async_db)):
+    if await db.scalar(select(User.id).where(User.email==data.email)):
         raise HTTPException(409, detail=t("auth.email_taken", lang=data.preferred_lang))
-    user = User(email=data.email, hashed_password=hash_password(data.password), preferred_lang=data.preferred_lang)
-    db.add(user); db.commit()
-    token = create_access_token(sub=user.email)
+    user = User(email=data.email, hashed_password=await password_pool.hash(data.password), preferred_lang=data.preferred_lang)
+    db.add(user); await db.flush()
+    db.add(UserStat(user_id=user.id, total_chats=0, total_messages=0)); await db.commit()
+    token = create_access_token(sub=user.email, uid=user.id)
     return TokenOut(access_token=token)
 
 @router.post("/login", response_model=TokenOut)
-def login(data: LoginIn, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email==data.email).first()
-    if not user or not verify_password(data.password, user.hashed_password):
+async def login(data: LoginIn, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.email==data.email))
+    ok, new_hash = await password_pool.verify(data.password, user.hashed_password) if user else (False, None)
+    if not ok:
         raise HTTPException(401, detail=t("auth.invalid_credentials", lang=getattr(user,"preferred_lang","en")))
-    token = create_access_token(sub=user.email)
+    if new_hash:
+        # argon2 settings changed since this hash was made
+        user.hashed_password = new_hash
+        await db.commit()
+    token = create_access_token(sub=user.email, uid=user.id)
     return TokenOut(access_token=token)
 
 @router.post("/logout")
@@ -41,30 +46,26 @@ def logout():
 
 
 @router.get("/profile", response_model=ProfileResponse)
-async def get_profile(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    total_chats = db.query(func.count(Chat.id)).filter(Chat.user_id == user.id).scalar()
-    total_messages = (
-        db.query(func.count(Message.id))
-        .join(Chat)
-        .filter(Chat.user_id == user.id)
-        .scalar()
+async def get_profile(db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)):
+    stats = await db.get(UserStat, user.id)
+    if stats is None:
+        # signup and rebuild() give every user a row, so this only runs once for a user whose row went missing
+        for stmt in rebuild_stats(user.id):
+            await db.execute(stmt)
+        await db.commit()
+        stats = await db.get(UserStat, user.id)
+    fav_model = await db.scalar(
+        select(UserModelStat.model)
+        .where(UserModelStat.user_id == user.id, UserModelStat.assistant_messages > 0)
+        .order_by(UserModelStat.assistant_messages.desc())
+        .limit(1)
     )
-    fav_model = (
-        db.query(Message.model, func.count(Message.id))
-        .join(Chat)
-        .filter(Chat.user_id == user.id, Message.role == "assistant", Message.model != None)
-        .group_by(Message.model)
-        .order_by(func.count(Message.id).desc())
-        .first()
-    )
-    favorite_model = fav_model[0] if fav_model else "gemini"
+    favorite_model = fav_model or "gemini"
 
-    prov = provider_from_name("gemini")
-    global_summary = None
-    if prov:
-        global_summary = await refresh_user_summary(
-            prov, user, db, user.preferred_lang.value
-        )
+    # written by the profile summaries batch job (app/ai/profile_summaries.py), never computed here
+    global_summary = await db.scalar(
+        select(UserSummary.summary).where(UserSummary.user_id == user.id, UserSummary.lang == user.preferred_lang)
+    )
 
     return ProfileResponse(
         user=UserProfile(
@@ -73,8 +74,8 @@ async def get_profile(db: Session = Depends(get_db), user=Depends(get_current_us
             member_since=user.created_at.strftime("%Y-%m-%d"),
         ),
         stats=UserStats(
-            total_chats=total_chats,
-            total_messages=total_messages,
+            total_chats=stats.total_chats if stats else 0,
+            total_messages=stats.total_messages if stats else 0,
             favorite_model=favorite_model,
         ),
         summary=global_summary
@@ -0,0 +1,258 @@
+"""NDJSON export/import of a user's chats.
+
+One JSON object per line, each chat followed by its messages:
+
+    {"type": "chat", "id": 3, "title": "...", "created_at": "...", "summary": {"lang": "en", "summary": "..."}}
+    {"type": "message", "chat_id": 3, "role": "user", "content": "...", "model": null, "lang": "en", "created_at": "..."}
+
+Both directions run in constant memory: the export reads through a server-side cursor
+(yield_per), the import spools the body to a temp file and inserts it in executemany batches.
+"""
+import json
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal, Optional
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.models import Chat, ChatSummary, Lang, Message, Role
+from app.db.session import AsyncSessionLocal
+from app.db.stats import rebuild as rebuild_stats, record_messages
+from app.messages.search import index_rows, unindex_chat
+
+settings = get_settings()
+# an upload is kept in memory up to this size, past it in a temp file
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+
+
+class InvalidImport(ValueError):
+    def __init__(self, line: int, detail: str):
+        super().__init__(f"line {line}: {detail}")
+        self.line = line
+
+
+class SummaryRecord(BaseModel):
+    lang: Lang
+    summary: str
+
+
+class ChatRecord(BaseModel):
+    type: Literal["chat"]
+    id: int  # the exporter's id, only used to match the messages to the chat
+    title: str = "New Chat"
+    created_at: Optional[datetime] = None
+    summary: Optional[SummaryRecord] = None
+
+
+class MessageRecord(BaseModel):
+    type: Literal["message"]
+    chat_id: int
+    role: Role
+    content: str
+    model: Optional[str] = None
+    lang: Lang
+    created_at: Optional[datetime] = None
+
+
+def _ts(value) -> str | None:
+    # sqlite hands back naive utc
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def _line(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def export_chats(user_id: int) -> AsyncIterator[bytes]:
+    # own session: the request's one is closed before a streamed body is sent.
+    # plain columns rather than orm objects, so nothing piles up in the identity map
+    q = (
+        select(
+            Chat.id, Chat.title, Chat.created_at, ChatSummary.lang, ChatSummary.summary,
+            Message.role, Message.content, Message.model, Message.lang, Message.created_at,
+        )
+        .outerjoin(ChatSummary, ChatSummary.chat_id == Chat.id)
+        .outerjoin(Message, Message.chat_id == Chat.id)
+        .where(Chat.user_id == user_id)
+        .order_by(Chat.id, Message.id)
+        .execution_options(yield_per=settings.CHAT_EXPORT_BATCH_SIZE)
+    )
+    async with AsyncSessionLocal() as db:
+        current = None
+        result = await db.stream(q)
+        async for rows in result.partitions():
+            out = []
+            for chat_id, title, chat_at, s_lang, s_text, role, content, model, lang, msg_at in rows:
+                if chat_id != current:
+                    current = chat_id
+                    out.append(_line({
+                        "type": "chat", "id": chat_id, "title": title, "created_at": _ts(chat_at),
+                        "summary": {"lang": s_lang.value, "summary": s_text} if s_text is not None else None,
+                    }))
+                if role is not None:
+                    out.append(_line({
+                        "type": "message", "chat_id": chat_id, "role": role.value, "content": content,
+                        "model": model, "lang": lang.value, "created_at": _ts(msg_at),
+                    }))
+            yield b"".join(out)
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    buf, n = b"", 0
+    async for chunk in chunks:
+        buf += chunk
+        if len(buf) > settings.CHAT_IMPORT_MAX_LINE_BYTES and b"\n" not in buf:
+            raise InvalidImport(n + 1, "line too long")
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            n += 1
+            if line.strip():
+                yield n, line
+    if buf.strip():
+        yield n + 1, buf
+
+
+def _utc(value: datetime | None, now: datetime) -> datetime:
+    if value is None:
+        return now
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _parse(n: int, line: bytes) -> ChatRecord | MessageRecord:
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        raise InvalidImport(n, "invalid json")
+    kind = raw.get("type") if isinstance(raw, dict) else None
+    if kind not in ("chat", "message"):
+        raise InvalidImport(n, "type must be 'chat' or 'message'")
+    try:
+        return (ChatRecord if kind == "chat" else MessageRecord).model_validate(raw)
+    except ValidationError as e:
+        raise InvalidImport(n, f"invalid {kind}: {e.errors()[0]['msg']}")
+
+
+async def _spool(chunks: AsyncIterator[bytes]):
+    # the whole body is read and checked before the first write, a bad line costs no transaction at all
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    seen: set[int] = set()
+    try:
+        async for n, line in _lines(chunks):
+            record = _parse(n, line)
+            if isinstance(record, ChatRecord):
+                if record.id in seen:
+                    raise InvalidImport(n, f"chat {record.id} appears twice")
+                seen.add(record.id)
+            elif record.chat_id not in seen:
+                raise InvalidImport(n, f"message for chat {record.chat_id} before that chat")
+            spool.write(line.strip() + b"\n")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def _undo(db: AsyncSession, user_id: int, chat_ids: list[int]):
+    # takes the chats of a failed import out again, with their index rows, and recounts the user's stats
+    dialect = db.bind.dialect.name
+    for chat_id in chat_ids:
+        await db.execute(unindex_chat(dialect, chat_id))
+    for model in (ChatSummary, Message):
+        await db.execute(delete(model).where(model.chat_id.in_(chat_ids)))
+    await db.execute(delete(Chat).where(Chat.id.in_(chat_ids)))
+    for stmt in rebuild_stats(user_id):
+        await db.execute(stmt)
+    await db.commit()
+
+
+async def import_chats(db: AsyncSession, user_id: int, chunks: AsyncIterator[bytes]) -> dict:
+    """Reads and validates the whole body first (spooled to disk past SPOOL_MEMORY_BYTES), then writes it in
+    transactions of up to CHAT_IMPORT_BATCH_SIZE messages: sqlite has one writer, and holding it for a whole
+    upload would stall everyone's sends. Chats get new ids. A bad line raises InvalidImport before anything is
+    written, and if writing fails halfway the chats committed so far are deleted again."""
+    spool = await _spool(chunks)
+    dialect = db.bind.dialect.name
+    now = datetime.now(timezone.utc)
+    chat_ids: dict[int, int] = {}
+    batch: list[dict] = []
+    chats = messages = 0
+    new_chats = 0
+    per_model: Counter = Counter()
+
+    async def flush():
+        # one transaction: the messages, their index rows, and the counters for what it commits
+        nonlocal messages, new_chats
+        if batch:
+            if dialect == "postgresql":
+                rows = (await db.execute(
+                    insert(Message).returning(Message.id, Message.chat_id, Message.content), batch
+                )).all()
+            else:
+                # RETURNING on an executemany makes sqlite insert row by row, so the ids are read back. Earlier
+                # batches are committed and the user may have written into those chats since, so only this
+                # batch's ids: this transaction holds the write lock and ids are autoincrement, so they are the
+                # last len(batch) ones
+                await db.execute(insert(Message), batch)
+                last = await db.scalar(select(func.max(Message.id)))
+                rows = (await db.execute(
+                    select(Message.id, Message.chat_id, Message.content)
+                    .where(Message.id > last - len(batch), Message.id <= last)
+                )).all()
+            await index_rows(db, user_id, rows)
+        stmts = record_messages(dialect, user_id, messages=len(batch), new_chats=new_chats)
+        for model, count in per_model.items():
+            stmts += record_messages(dialect, user_id, messages=0, model=model, assistant_messages=count)
+        for stmt in stmts:
+            await db.execute(stmt)
+        await db.commit()
+        messages += len(batch)
+        batch.clear()
+        per_model.clear()
+        new_chats = 0
+
+    try:
+        for n, line in enumerate(spool, 1):
+            record = _parse(n, line)
+            if isinstance(record, ChatRecord):
+                new_id = await db.scalar(
+                    insert(Chat).values(user_id=user_id, title=record.title[:255],
+                                        created_at=_utc(record.created_at, now))
+                    .returning(Chat.id)
+                )
+                chat_ids[record.id] = new_id
+                if record.summary:
+                    # which of the messages it covers didn't survive the export, so none: they all stay verbatim
+                    # until the summary policy gets to them
+                    await db.execute(insert(ChatSummary).values(
+                        chat_id=new_id, lang=record.summary.lang, summary=record.summary.summary,
+                        covered_message_id=0))
+                chats += 1
+                new_chats += 1
+                continue
+
+            batch.append({
+                "chat_id": chat_ids[record.chat_id], "role": record.role, "content": record.content,
+                "model": record.model, "lang": record.lang, "created_at": _utc(record.created_at, now),
+            })
+            if record.role == Role.assistant and record.model:
+                per_model[record.model] += 1
+            if len(batch) >= settings.CHAT_IMPORT_BATCH_SIZE:
+                await flush()
+        await flush()
+    except BaseException:
+        await db.rollback()
+        if chat_ids:
+            await _undo(db, user_id, list(chat_ids.values()))
+        raise
+    finally:
+        spool.close()
+    return {"chats": chats, "messages": messages}
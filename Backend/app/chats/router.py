@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.deps import get_db, get_current_user
-from app.db.models import Chat, Message, UserSummary, Lang
-from app.chats.schemas import ChatListResponse,ChatDetailResponse,DeleteChatResponse,ChatItem,MessageItem
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import get_async_db, get_principal
+from app.db.models import Chat, Message, UserSummary, Lang, Role
+from app.db.stats import chat_message_counts, record_chat_deleted
+from app.messages.search import unindex_chat
+from app.chats.schemas import ChatListResponse,ChatDetailResponse,DeleteChatResponse,ChatItem,MessageItem,ImportChatsResponse
+from app.chats.portability import InvalidImport, export_chats, import_chats
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 # we dont need this endpoint for now
@@ -13,29 +18,104 @@ router = APIRouter(prefix="/chats", tags=["chats"])
 #     db.add(chat); db.commit(); db.refresh(chat)
 #     return {"id": chat.id, "title": chat.title}
 
+# per user, and the browser has to come back with If-None-Match before reusing a cached copy
+CACHE_HEADERS = {"Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    # weak comparison: W/ prefixes don't matter, "*" matches anything
+    header = request.headers.get("if-none-match")
+    if header:
+        tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+    return None
+
+
 @router.get("", response_model=ChatListResponse)
-def list_chats(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    chats = (
-        db.query(Chat)
-        .filter(Chat.user_id == user.id)
-        .order_by(Chat.created_at.desc())
-        .all()
+async def list_chats(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_principal),
+):
+    # chats are only ever added or deleted and ids are never reused, so the newest id and the count change
+    # whenever the list does. read before the list: a chat added in between makes the next request miss,
+    # it never hides a change
+    newest, count = (await db.execute(
+        select(func.max(Chat.id), func.count()).where(Chat.user_id == user.id)
+    )).one()
+    etag = f'W/"chats.{newest or 0}.{count}"'
+    if not_modified := _not_modified(request, etag):
+        return not_modified
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+
+    # keyset pagination on (created_at, id), walks the (user_id, created_at) index
+    q = select(Chat).where(Chat.user_id == user.id)
+    if before_id is not None:
+        # compared in sql against the stored value, sqlite keeps timestamps as text and a bound
+        # python datetime wouldn't compare equal to it
+        cursor = select(Chat.created_at).where(Chat.id == before_id, Chat.user_id == user.id).scalar_subquery()
+        q = q.where(or_(Chat.created_at < cursor, and_(Chat.created_at == cursor, Chat.id < before_id)))
+
+    chats = (await db.scalars(q.order_by(Chat.created_at.desc(), Chat.id.desc()).limit(limit + 1))).all()
+    more = len(chats) > limit
+    chats = chats[:limit]
+    return ChatListResponse(
+        items=[ChatItem.model_validate(c) for c in chats],
+        next_before_id=chats[-1].id if more else None,
     )
-    return ChatListResponse(items=[ChatItem.model_validate(c) for c in chats])
+
+
+@router.get("/export")
+async def export(user=Depends(get_principal)):
+    # declared before /{chat_id} so "export" isn't read as an id
+    return StreamingResponse(
+        export_chats(user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="chats.ndjson"'},
+    )
+
+
+@router.post("/import", response_model=ImportChatsResponse)
+async def import_(request: Request, db: AsyncSession = Depends(get_async_db), user=Depends(get_principal)):
+    # validated in full before the first write, then committed in batches (see import_chats)
+    try:
+        counts = await import_chats(db, user.id, request.stream())
+    except InvalidImport as e:
+        raise HTTPException(400, detail=str(e))
+    return ImportChatsResponse(**counts)
 
 
 @router.get("/{chat_id}", response_model=ChatDetailResponse)
-def get_chat(chat_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user.id).first()
+async def get_chat(
+    request: Request,
+    response: Response,
+    chat_id: int,
+    limit: int = Query(100, ge=1, le=500),
+    before_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_principal),
+):
+    # messages are append-only and ids are never reused, the chat's last message id is its version
+    last = select(func.max(Message.id)).where(Message.chat_id == Chat.id).scalar_subquery().label("last_message_id")
+    chat = (await db.execute(select(Chat.id, Chat.title, last).where(Chat.id == chat_id, Chat.user_id == user.id))).first()
     if not chat:
         raise HTTPException(404, "Chat not found")
+    etag = f'W/"chat.{chat.id}.{chat.last_message_id or 0}"'
+    if not_modified := _not_modified(request, etag):
+        return not_modified
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
 
-    msgs = (
-        db.query(Message)
-        .filter(Message.chat_id == chat.id)
-        .order_by(Message.id.asc())
-        .all()
-    )
+    # newest page first through the (chat_id, id) index, returned oldest first like before
+    q = select(Message).where(Message.chat_id == chat.id)
+    if before_id is not None:
+        q = q.where(Message.id < before_id)
+    msgs = (await db.scalars(q.order_by(Message.id.desc()).limit(limit + 1))).all()
+    more = len(msgs) > limit
+    msgs = list(reversed(msgs[:limit]))
 
     return ChatDetailResponse(
         id=chat.id,
@@ -51,15 +131,27 @@ def get_chat(chat_id: int, db: Session = Depends(get_db), user=Depends(get_curre
             )
             for m in msgs
         ],
+        next_before_id=msgs[0].id if more else None,
     )
 
 
 @router.delete("/{chat_id}", response_model=DeleteChatResponse)
-def delete_chat(chat_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user.id).first()
+async def delete_chat(chat_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_principal)):
+    chat = await db.scalar(select(Chat).where(Chat.id == chat_id, Chat.user_id == user.id))
     if not chat:
         raise HTTPException(404, detail="Chat not found")
 
-    db.delete(chat)
-    db.commit()
+    total, per_model = 0, {}
+    for model, role, n in await db.execute(chat_message_counts(chat.id)):
+        total += n
+        if role == Role.assistant and model:
+            per_model[model] = per_model.get(model, 0) + n
+
+    await db.execute(unindex_chat(db.bind.dialect.name, chat.id))
+    # the orm cascade needs the children loaded, lazy loads aren't allowed on the async session
+    await db.refresh(chat, ["messages", "summary", "summary_jobs", "segments"])
+    await db.delete(chat)
+    for stmt in record_chat_deleted(user.id, total, per_model):
+        await db.execute(stmt)
+    await db.commit()
     return DeleteChatResponse(message=f"Chat {chat_id} deleted successfully")
\ No newline at end of file
@@ -34,6 +34,7 @@ class ChatItem(BaseModel):
 
 class ChatListResponse(BaseModel):
     items: List[ChatItem]
+    next_before_id: Optional[int] = None  # pass as before_id to get the next (older) page
 
 
 class MessageItem(BaseModel):
@@ -52,7 +53,12 @@ class ChatDetailResponse(BaseModel):
     id: int
     title: str
     messages: List[MessageItem]
+    next_before_id: Optional[int] = None  # messages are oldest first, this pages further back
 
 
 class DeleteChatResponse(BaseModel):
-    message: str
\ No newline at end of file
+    message: str
+
+class ImportChatsResponse(BaseModel):
+    chats: int
+    messages: int
@@ -4,23 +4,160 @@ from dotenv import load_dotenv
 
 load_dotenv()  
 
+def _csv(name: str, default: str) -> list[str]:
+    return [x.strip() for x in os.getenv(name, default).split(",") if x.strip()]
+
+def _kv(name: str, default: str) -> dict[str, int]:
+    # "gemini=16,groq=8" -> {"gemini": 16, "groq": 8}
+    return {k.strip(): int(v) for k, v in (x.split("=") for x in _csv(name, default))}
+
 class Settings(BaseModel):
     APP_NAME: str = os.getenv("APP_NAME", "AI Chat Backend")
     APP_ENV: str = os.getenv("APP_ENV", "dev")
     BACKEND_CORS_ORIGINS: list[str] = os.getenv("BACKEND_CORS_ORIGINS","").split(",") if os.getenv("BACKEND_CORS_ORIGINS") else ["*"]
 
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+    # create missing tables/indexes on startup; turn off in prod and run `python -m app.db.migrate` on deploy
+    DB_AUTO_MIGRATE: bool = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+    # connection pool per engine (sync and async each get one), per worker process. leave room under the
+    # server's max_connections for workers * 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))  # -1 = never
+    # pragmas run on every new sqlite connection, an empty value leaves sqlite's default
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
 
     JWT_SECRET: str = os.getenv("JWT_SECRET", "change_me")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM","HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES","120"))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    PRINCIPAL_CACHE_TTL_SECONDS: float = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "300"))
+
+    # argon2 cost (defaults are passlib's) and the process pool that runs it
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "3"))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "4"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+    # per-user token buckets on the llm endpoints: requests and llm tokens (prompt + reply, estimated) per window.
+    # RATE_LIMIT_BACKEND is "memory" (per process), "sqlite" (shared by the workers on a host) or "redis"
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv("RATE_LIMIT_SQLITE_PATH", "./ratelimit.db")
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    RATE_LIMIT_MEMORY_SIZE: int = int(os.getenv("RATE_LIMIT_MEMORY_SIZE", "100000"))
+    RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "30"))
+    RATE_LIMIT_REQUESTS_WINDOW_SECONDS: float = float(os.getenv("RATE_LIMIT_REQUESTS_WINDOW_SECONDS", "60"))
+    RATE_LIMIT_TOKENS: int = int(os.getenv("RATE_LIMIT_TOKENS", "200000"))
+    RATE_LIMIT_TOKENS_WINDOW_SECONDS: float = float(os.getenv("RATE_LIMIT_TOKENS_WINDOW_SECONDS", "3600"))
+
+    # /chats/export rows per server-side cursor fetch, /chats/import messages per executemany
+    CHAT_EXPORT_BATCH_SIZE: int = int(os.getenv("CHAT_EXPORT_BATCH_SIZE", "1000"))
+    CHAT_IMPORT_BATCH_SIZE: int = int(os.getenv("CHAT_IMPORT_BATCH_SIZE", "1000"))
+    CHAT_IMPORT_MAX_LINE_BYTES: int = int(os.getenv("CHAT_IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+
+    # /ws: generations one connection may run at once, seconds to send the auth frame after connecting
+    WS_MAX_IN_FLIGHT: int = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+    WS_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+
+    # /messages/batch: items per job, llm calls batch jobs may run at once per vendor (kept below
+    # PROVIDER_CONCURRENCY so interactive traffic still gets slots), results per write, jobs per worker process.
+    # a running job whose heartbeat is older than BATCH_STALE_SECONDS is taken over by another worker
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    BATCH_CONCURRENCY: dict[str, int] = _kv("BATCH_CONCURRENCY", "gemini=8,mistral=8,groq=8")
+    BATCH_WRITE_SIZE: int = int(os.getenv("BATCH_WRITE_SIZE", "50"))
+    BATCH_FLUSH_SECONDS: float = float(os.getenv("BATCH_FLUSH_SECONDS", "2"))
+    BATCH_MAX_JOBS: int = int(os.getenv("BATCH_MAX_JOBS", "4"))
+    BATCH_MAX_ATTEMPTS: int = int(os.getenv("BATCH_MAX_ATTEMPTS", "5"))
+    BATCH_POLL_SECONDS: float = float(os.getenv("BATCH_POLL_SECONDS", "30"))
+    BATCH_STALE_SECONDS: float = float(os.getenv("BATCH_STALE_SECONDS", "120"))
+
+    # prometheus metrics at GET /metrics (keep it off the public network)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
 
     DEFAULT_LANG: str = os.getenv("DEFAULT_LANG","en")
+    # "script" (unicode script ratio), "langdetect", or "hybrid" (langdetect when the script ratio is inconclusive)
+    LANG_DETECT_MODE: str = os.getenv("LANG_DETECT_MODE", "script")
+    LANG_DETECT_THRESHOLD: float = float(os.getenv("LANG_DETECT_THRESHOLD", "0.6"))
+    LANG_DETECT_MAX_CHARS: int = int(os.getenv("LANG_DETECT_MAX_CHARS", "4000"))
 
     GEMINI_API_KEY: str | None = os.getenv("GEMINI_API_KEY") or None
     Mistral_API_KEY: str | None = os.getenv("Mistral_API_KEY") or None
     GROQ_API_KEY: str | None = os.getenv("GROQ_API_KEY") or None
 
+    # models served per vendor, the first one is what the bare vendor name ("gemini", ...) resolves to
+    GEMINI_MODELS: list[str] = _csv("GEMINI_MODELS", "gemini-2.5-flash")
+    GROQ_MODELS: list[str] = _csv("GROQ_MODELS", "llama-3.1-8b-instant")
+    MISTRAL_MODELS: list[str] = _csv("MISTRAL_MODELS", "mistral-small-latest")
+    PROVIDER_ORDER: list[str] = _csv("PROVIDER_ORDER", "gemini,mistral,groq")
+
+    # local fake vendor for load tests (app/ai/providers/fake.py): lognormal latency around FAKE_LATENCY_MS,
+    # replies of FAKE_REPLY_TOKENS words streamed at FAKE_TOKENS_PER_SECOND (0 = instant), FAKE_FAILURE_RATE of calls fail
+    FAKE_PROVIDER_ENABLED: bool = os.getenv("FAKE_PROVIDER_ENABLED", "false").lower() == "true"
+    FAKE_MODELS: list[str] = _csv("FAKE_MODELS", "fake")
+    FAKE_LATENCY_MS: float = float(os.getenv("FAKE_LATENCY_MS", "300"))
+    FAKE_LATENCY_SIGMA: float = float(os.getenv("FAKE_LATENCY_SIGMA", "0.5"))
+    FAKE_TOKENS_PER_SECOND: float = float(os.getenv("FAKE_TOKENS_PER_SECOND", "0"))
+    FAKE_REPLY_TOKENS: int = int(os.getenv("FAKE_REPLY_TOKENS", "60"))
+    FAKE_FAILURE_RATE: float = float(os.getenv("FAKE_FAILURE_RATE", "0"))
+    FAKE_SEED: int = int(os.getenv("FAKE_SEED", "0"))
+
+    # shared http pools for the provider sdks
+    PROVIDER_MAX_CONNECTIONS: int = int(os.getenv("PROVIDER_MAX_CONNECTIONS", "20"))
+    PROVIDER_MAX_KEEPALIVE: int = int(os.getenv("PROVIDER_MAX_KEEPALIVE", "10"))
+    PROVIDER_TIMEOUT_SECONDS: float = float(os.getenv("PROVIDER_TIMEOUT_SECONDS", "60"))
+
+    # in-flight llm calls per vendor, plus how many requests may wait for a slot before we answer 503
+    PROVIDER_CONCURRENCY: dict[str, int] = _kv("PROVIDER_CONCURRENCY", "gemini=16,mistral=16,groq=16")
+    PROVIDER_MAX_QUEUE: int = int(os.getenv("PROVIDER_MAX_QUEUE", "32"))
+    PROVIDER_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("PROVIDER_QUEUE_TIMEOUT_SECONDS", "10"))
+
+    # routing: fail over to the next healthy vendor, optionally hedge unpinned requests after the p95 latency
+    ROUTER_FAILOVER: bool = os.getenv("ROUTER_FAILOVER", "true").lower() == "true"
+    ROUTER_HEDGE: bool = os.getenv("ROUTER_HEDGE", "false").lower() == "true"
+    ROUTER_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("ROUTER_HEDGE_MIN_DELAY_SECONDS", "2"))
+    ROUTER_EWMA_ALPHA: float = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+    ROUTER_CIRCUIT_FAILURES: int = int(os.getenv("ROUTER_CIRCUIT_FAILURES", "5"))
+    ROUTER_CIRCUIT_OPEN_SECONDS: float = float(os.getenv("ROUTER_CIRCUIT_OPEN_SECONDS", "30"))
+
+    # completion cache, COMPLETION_CACHE_PATH turns on the sqlite tier
+    COMPLETION_CACHE_ENABLED: bool = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+    COMPLETION_CACHE_SIZE: int = int(os.getenv("COMPLETION_CACHE_SIZE", "1024"))
+    COMPLETION_CACHE_TTL_SECONDS: float = float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "3600"))
+    COMPLETION_CACHE_PATH: str | None = os.getenv("COMPLETION_CACHE_PATH") or None
+
+    # prompt assembly: token budget per provider/model name, and how many recent messages we read at most
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+    CONTEXT_TOKEN_BUDGETS: dict[str, int] = _kv("CONTEXT_TOKEN_BUDGETS", "gemini=16000,mistral=8000,groq=4000")
+    CONTEXT_MAX_MESSAGES: int = int(os.getenv("CONTEXT_MAX_MESSAGES", "50"))
+
+    # background chat-summary worker
+    SUMMARY_WORKER_CONCURRENCY: int = int(os.getenv("SUMMARY_WORKER_CONCURRENCY", "2"))
+    SUMMARY_DEBOUNCE_SECONDS: float = float(os.getenv("SUMMARY_DEBOUNCE_SECONDS", "2"))
+    # every process runs a worker, a chat is claimed by one of them for at most this long (longer than a run takes)
+    SUMMARY_LEASE_SECONDS: float = float(os.getenv("SUMMARY_LEASE_SECONDS", "300"))
+    # summarization policy (app/ai/summary_policy.py): nothing happens until the messages after the last summary
+    # add up to SUMMARY_TRIGGER_TOKENS, the newest SUMMARY_KEEP_TOKENS of them stay verbatim
+    SUMMARY_TRIGGER_TOKENS: int = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "2000"))
+    SUMMARY_KEEP_TOKENS: int = int(os.getenv("SUMMARY_KEEP_TOKENS", "600"))
+    SUMMARY_MAX_SEGMENTS: int = int(os.getenv("SUMMARY_MAX_SEGMENTS", "4"))
+
+    # profile summaries batch job, 0 disables the in-process schedule (run `python -m app.ai.profile_summaries` instead)
+    PROFILE_SUMMARY_INTERVAL_SECONDS: float = float(os.getenv("PROFILE_SUMMARY_INTERVAL_SECONDS", "600"))
+    # one process runs a round and each user it picks is claimed for this long, so a user is refreshed at most once
+    # per period and a crashed run holds the job up no longer than that. keep it close to the interval
+    PROFILE_SUMMARY_LEASE_SECONDS: float = float(os.getenv("PROFILE_SUMMARY_LEASE_SECONDS", "600"))
+    PROFILE_SUMMARY_BATCH_SIZE: int = int(os.getenv("PROFILE_SUMMARY_BATCH_SIZE", "50"))
+    PROFILE_SUMMARY_CONCURRENCY: int = int(os.getenv("PROFILE_SUMMARY_CONCURRENCY", "4"))
+    PROFILE_SUMMARY_MAX_CHATS: int = int(os.getenv("PROFILE_SUMMARY_MAX_CHATS", "50"))
+    PROFILE_SUMMARY_PROVIDER: str = os.getenv("PROFILE_SUMMARY_PROVIDER", "gemini")
+
 
 def get_settings() -> Settings:
     return Settings()
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""Prometheus metrics, scraped from GET /metrics.
+
+With several workers set PROMETHEUS_MULTIPROC_DIR to an empty directory so the
+workers' samples are merged (see the prometheus_client docs on multiprocess mode).
+"""
+import os
+import time
+
+import anyio
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from starlette.responses import Response
+
+from app.core.security import password_pool
+
+# llm calls take seconds, db queries and most requests milliseconds
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route template",
+                         ["method", "route", "status"])
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled", multiprocess_mode="livesum")
+
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "Provider call latency (full reply)",
+                        ["provider", "model", "op"], buckets=LLM_BUCKETS)
+LLM_FIRST_TOKEN = Histogram("llm_time_to_first_token_seconds", "Streaming calls, time until the first delta",
+                            ["provider", "model"], buckets=LLM_BUCKETS)
+LLM_ERRORS = Counter("llm_errors_total", "Provider calls that raised", ["provider", "model", "error"])
+LLM_IN_FLIGHT = Gauge("llm_in_flight", "Provider calls holding a concurrency slot", ["vendor"],
+                      multiprocess_mode="livesum")
+LLM_WAITING = Gauge("llm_waiting", "Callers queued for a provider slot", ["vendor"], multiprocess_mode="livesum")
+
+DB_LATENCY = Histogram("db_query_duration_seconds", "Statement execution time", ["engine", "op"], buckets=DB_BUCKETS)
+
+SUMMARY_JOB_LATENCY = Histogram("summary_job_duration_seconds", "Background chat summary update, llm call included",
+                                buckets=LLM_BUCKETS)
+SUMMARY_CALLS = Counter("summary_llm_calls_total", "Summarizer calls made by the summary worker", ["kind"])
+
+
+class MetricsMiddleware:
+    """Plain ASGI, so streaming responses are timed until the last chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            # the route template keeps the label set small, /chats/{chat_id} instead of every id
+            route = scope.get("route")
+            HTTP_LATENCY.labels(scope["method"], getattr(route, "path", "unmatched"), f"{status // 100}xx").observe(
+                time.perf_counter() - start
+            )
+
+
+def instrument_engine(engine, name: str):
+    # start times are kept on the connection, a connection runs one statement at a time
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        op = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_LATENCY.labels(name, op if op in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER").observe(
+            time.perf_counter() - start
+        )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("query_start") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+class RuntimeCollector:
+    # read at scrape time, nothing on the hot path
+    def collect(self):
+        try:
+            stats = anyio.to_thread.current_default_thread_limiter().statistics()
+        except RuntimeError:  # no event loop, e.g. scraped from a thread
+            stats = None
+        if stats is not None:
+            yield GaugeMetricFamily("threadpool_busy_threads", "Threads running sync endpoints/dependencies",
+                                    value=stats.borrowed_tokens)
+            yield GaugeMetricFamily("threadpool_max_threads", "Size of the anyio worker thread pool",
+                                    value=stats.total_tokens)
+            yield GaugeMetricFamily("threadpool_queue_depth", "Calls waiting for a worker thread",
+                                    value=stats.tasks_waiting)
+        yield GaugeMetricFamily("password_hash_pending", "Hashes queued or running on the process pool",
+                                value=password_pool.pending)
+
+
+def register_runtime_collector():
+    # called from main when metrics are enabled
+    REGISTRY.register(RuntimeCollector())
+
+
+def metrics_response() -> Response:
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(RuntimeCollector())
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
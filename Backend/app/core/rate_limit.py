@@ -0,0 +1,223 @@
+"""Per-user token buckets: requests per window and LLM tokens per window.
+
+A bucket holds up to `limit` units and refills at limit/window per second. Buckets
+live in a pluggable store: "memory" (per process), "sqlite" (a file shared by the
+workers on one host) or "redis" (anything speaking the redis protocol, needs the
+`redis` package).
+"""
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+import anyio
+from cachetools import TTLCache
+
+from app.core.config import get_settings
+
+
+@dataclass(frozen=True, slots=True)
+class Bucket:
+    name: str
+    limit: int
+    window: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.window
+
+
+@dataclass(frozen=True, slots=True)
+class Decision:
+    bucket: Bucket
+    allowed: bool
+    tokens: float  # left after this call, negative when the user is in debt
+
+    @property
+    def remaining(self) -> int:
+        return max(0, math.floor(self.tokens))
+
+    @property
+    def reset(self) -> int:
+        # seconds until the bucket is full again
+        return math.ceil(max(0.0, self.bucket.limit - self.tokens) / self.bucket.rate)
+
+    def retry_after(self, cost: float = 1) -> int:
+        return max(1, math.ceil((cost - self.tokens) / self.bucket.rate))
+
+
+def refill(tokens: float, ts: float, now: float, limit: int, rate: float) -> float:
+    return min(float(limit), tokens + max(0.0, now - ts) * rate)
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, decision: Decision, cost: float = 1):
+        super().__init__(f"{decision.bucket.name} quota exceeded")
+        self.decision = decision
+        self.retry_after = decision.retry_after(cost)
+
+
+class MemoryStore:
+    # buckets untouched for a whole window are full again, so dropping them is the same as keeping them
+    def __init__(self, maxsize: int, ttl: float):
+        self._buckets: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def take(self, key: str, limit: int, rate: float, cost: float, force: bool = False) -> tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts = self._buckets.get(key, (float(limit), now))
+        tokens = refill(tokens, ts, now, limit, rate)
+        allowed = force or tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        return allowed, tokens
+
+    async def close(self):
+        self._buckets.clear()
+
+
+class SQLiteStore:
+    """One row per bucket in a local file, BEGIN IMMEDIATE makes the read-modify-write atomic across processes."""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL)")
+        self._lock = threading.Lock()
+
+    def _take(self, key: str, limit: int, rate: float, cost: float, force: bool) -> tuple[bool, float]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._db.execute("SELECT tokens, ts FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = refill(row[0], row[1], now, limit, rate) if row else float(limit)
+                allowed = force or tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._db.execute("INSERT OR REPLACE INTO buckets (key, tokens, ts) VALUES (?, ?, ?)", (key, tokens, now))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return allowed, tokens
+
+    async def take(self, key: str, limit: int, rate: float, cost: float, force: bool = False) -> tuple[bool, float]:
+        return await anyio.to_thread.run_sync(self._take, key, limit, rate, cost, force)
+
+    async def close(self):
+        self._db.close()
+
+
+# KEYS[1] bucket, ARGV: limit, rate, cost, force, now. the refill runs server side so workers can't race
+_TAKE_SCRIPT = """
+local limit, rate, cost, force, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4] == '1', tonumber(ARGV[5])
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = limit
+if b[1] then tokens = math.min(limit, tonumber(b[1]) + math.max(0, now - tonumber(b[2])) * rate) end
+local allowed = force or tokens >= cost
+if allowed then tokens = tokens - cost end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((limit - tokens) / rate * 1000) + 1000)
+return {allowed and 1 or 0, tostring(tokens)}
+"""
+
+
+class RedisStore:
+    def __init__(self, url: str):
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis)") from e
+        self._redis = Redis.from_url(url)
+        self._script = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: int, rate: float, cost: float, force: bool = False) -> tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[f"rl:{key}"], args=[limit, rate, cost, int(force), time.time()])
+        return bool(allowed), float(tokens)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+class UserQuota:
+    """`requests` is charged one per call up front. `tokens` is charged after the LLM answered (the size isn't
+    known before), so a user may overdraw it once and is refused until it refills above zero."""
+
+    def __init__(self, store, requests: Bucket, tokens: Bucket):
+        self.store = store
+        self.requests = requests
+        self.tokens = tokens
+
+    async def _take(self, bucket: Bucket, user_id: int, cost: float, force: bool = False) -> Decision:
+        allowed, tokens = await self.store.take(f"{bucket.name}:{user_id}", bucket.limit, bucket.rate, cost, force)
+        return Decision(bucket, allowed, tokens)
+
+    async def check(self, user_id: int) -> list[Decision]:
+        tokens = await self._take(self.tokens, user_id, 0)
+        if tokens.tokens < 0:
+            raise QuotaExceeded(tokens, cost=0)
+        requests = await self._take(self.requests, user_id, 1)
+        if not requests.allowed:
+            raise QuotaExceeded(requests)
+        return [requests, tokens]
+
+    async def tokens_left(self, user_id: int) -> Decision:
+        # doesn't take anything, for callers that pace themselves (batch jobs)
+        return await self._take(self.tokens, user_id, 0)
+
+    async def charge_tokens(self, user_id: int, n: int) -> Decision:
+        return await self._take(self.tokens, user_id, n, force=True)
+
+    async def close(self):
+        await self.store.close()
+
+
+def tightest(decisions: list[Decision]) -> Decision:
+    # the RateLimit-* headers describe the bucket closest to running out
+    return min(decisions, key=lambda d: d.tokens / d.bucket.limit)
+
+
+def headers(decision: Decision, policies: list[Bucket]) -> dict[str, str]:
+    return {
+        "RateLimit-Limit": str(decision.bucket.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(decision.reset),
+        "RateLimit-Policy": ", ".join(f'{b.limit};w={int(b.window)};name="{b.name}"' for b in policies),
+    }
+
+
+def _make_store(settings):
+    backend = settings.RATE_LIMIT_BACKEND
+    if backend == "sqlite":
+        return SQLiteStore(settings.RATE_LIMIT_SQLITE_PATH)
+    if backend == "redis":
+        return RedisStore(settings.RATE_LIMIT_REDIS_URL)
+    if backend == "memory":
+        return MemoryStore(settings.RATE_LIMIT_MEMORY_SIZE,
+                           max(settings.RATE_LIMIT_REQUESTS_WINDOW_SECONDS, settings.RATE_LIMIT_TOKENS_WINDOW_SECONDS))
+    raise ValueError(f"unknown RATE_LIMIT_BACKEND {backend!r}")
+
+
+_quota: UserQuota | None = None
+
+
+def get_quota() -> UserQuota:
+    global _quota
+    if _quota is None:
+        settings = get_settings()
+        _quota = UserQuota(
+            _make_store(settings),
+            Bucket("requests", settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_REQUESTS_WINDOW_SECONDS),
+            Bucket("tokens", settings.RATE_LIMIT_TOKENS, settings.RATE_LIMIT_TOKENS_WINDOW_SECONDS),
+        )
+    return _quota
+
+
+async def close_quota():
+    global _quota
+    if _quota is not None:
+        await _quota.close()
+        _quota = None
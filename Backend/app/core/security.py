@@ -1,3 +1,6 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from app.core.config import get_settings
@@ -6,15 +9,76 @@ settings = get_settings()
 
 from passlib.hash import argon2
 
+# changing these re-hashes a user's password the next time they log in
+hasher = argon2.using(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+)
+
 def hash_password(password: str) -> str:
-    return argon2.hash(password)
+    return hasher.hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return argon2.verify(password, hashed)
+    return hasher.verify(password, hashed)
+
+def _verify_and_check(password: str, hashed: str) -> tuple[bool, str | None]:
+    # runs in the pool: returns a fresh hash too when the stored one uses old cost parameters
+    if not hasher.verify(password, hashed):
+        return False, None
+    return True, hasher.hash(password) if hasher.needs_update(hashed) else None
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class PasswordHashPool:
+    """Argon2 on a dedicated process pool, so hashing uses every core and never
+    takes threadpool slots or the event loop. Beyond max_queue pending jobs callers
+    get HashingBusy right away instead of queueing behind a login burst."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._pool: ProcessPoolExecutor | None = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_queue:
+            raise HashingBusy()
+        if self._pool is None:
+            # not forked: by now this process runs aiosqlite's and other threads, and a child forked while one
+            # of them holds a lock would wait on it forever. forkserver children start from a clean process
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        return await self._run(_verify_and_check, password, hashed)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
 
-def create_access_token(sub: str) -> str:
+def create_access_token(sub: str, uid: int | None = None) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {"sub": sub, "exp": expire}
+    if uid is not None:
+        # lets get_principal look the user up by primary key instead of by email
+        payload["uid"] = uid
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
 def decode_token(token: str) -> dict:
@@ -0,0 +1,48 @@
+"""Named leases, so background work that every worker process starts runs in one of them at a time.
+
+A lease is a row (name, owner, expires_at). Taking one is a single upsert that only overwrites a row that
+has expired or that the caller holds already, so it is atomic on sqlite and postgres alike, and a holder
+that died blocks the work for ttl seconds at most.
+"""
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Lease
+
+
+def owner() -> str:
+    # worked out per call, a process forked after import gets its own
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire(db: AsyncSession, name: str, ttl: float) -> bool:
+    """Takes or extends the lease for ttl seconds and commits. False while another process holds it."""
+    now = datetime.now(timezone.utc)
+    me = owner()
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(Lease).values(name=name, owner=me, expires_at=now + timedelta(seconds=ttl))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Lease.name],
+        set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+        where=or_(Lease.expires_at < now, Lease.owner == me),
+    ).returning(Lease.name)
+    taken = (await db.execute(stmt)).scalar() is not None
+    await db.commit()
+    return taken
+
+
+async def release(db: AsyncSession, name: str) -> None:
+    await db.execute(delete(Lease).where(Lease.name == name, Lease.owner == owner()))
+    await db.commit()
+
+
+async def prune(db: AsyncSession, prefix: str) -> None:
+    # for leases that are left to expire rather than released, they'd pile up otherwise
+    now = datetime.now(timezone.utc)
+    await db.execute(delete(Lease).where(Lease.name.startswith(prefix), Lease.expires_at < now))
+    await db.commit()
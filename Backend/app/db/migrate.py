@@ -0,0 +1,101 @@
+"""Schema setup: create missing tables, columns and indexes, the full-text search index and the profile counters.
+
+Runs on startup while DB_AUTO_MIGRATE is on (the default). With it off, run it once per deploy
+instead of in every worker:
+
+    python -m app.db.migrate
+"""
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from app.db import models  # noqa: F401  registers the tables on Base.metadata
+from app.db.base import Base
+from app.db.stats import rebuild as rebuild_stats
+from app.messages.search import ensure_index as ensure_search_index, reindex as reindex_search
+
+
+def add_missing_columns(engine) -> None:
+    # create_all leaves existing tables alone. new nullable columns can be added in place, anything
+    # else (not null, renames, type changes) needs a hand-written migration
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+
+def add_sqlite_autoincrement(engine) -> None:
+    # without AUTOINCREMENT sqlite gives a deleted max rowid to the next insert, and an existing table can't be
+    # altered into one. those tables are copied once into a new table, ids included, which takes over the name.
+    # the indexes went with the old table and are added back by migrate()
+    if engine.dialect.name != "sqlite":
+        return
+    # a copy of the schema, so the rebuilt table's foreign keys resolve without touching Base.metadata
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not table.dialect_options["sqlite"]["autoincrement"]:
+                continue
+            sql = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                              {"name": table.name})
+            if "AUTOINCREMENT" in sql.upper():
+                continue
+            rebuilt = table.to_metadata(metadata, name=f"{table.name}_rebuild")
+            conn.execute(CreateTable(rebuilt))
+            columns = ", ".join(c["name"] for c in inspect(conn).get_columns(table.name) if c["name"] in table.c)
+            conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"))
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+
+
+def make_indexes_unique(engine) -> None:
+    # an index that became unique in the models is a plain one in older databases, or missing altogether.
+    # the duplicates go (the newest row per key stays) and so does a plain index, migrate() then creates it unique
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = insp.get_indexes(table.name)
+            unique = {tuple(i["column_names"]) for i in existing if i["unique"]}
+            unique |= {tuple(u["column_names"]) for u in insp.get_unique_constraints(table.name)}
+            for index in table.indexes:
+                columns = tuple(c.name for c in index.columns)
+                if not index.unique or columns in unique:
+                    continue
+                keys = ", ".join(columns)
+                conn.execute(text(f"DELETE FROM {table.name} WHERE id NOT IN "
+                                  f"(SELECT max(id) FROM {table.name} GROUP BY {keys})"))
+                if any(i["name"] == index.name for i in existing):
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+
+
+def migrate(engine) -> None:
+    new_stats = not inspect(engine).has_table(models.UserStat.__tablename__)
+    Base.metadata.create_all(bind=engine)
+    add_sqlite_autoincrement(engine)
+    add_missing_columns(engine)
+    make_indexes_unique(engine)
+    # create_all only adds indexes together with new tables, so add the missing ones to existing tables too
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # the search index isn't an orm table; filled from the existing messages the first time it is created
+    with engine.begin() as conn:
+        if ensure_search_index(conn):
+            reindex_search(conn)
+    # same for the profile counters: the writes only add deltas, so existing chats are counted once up front
+    if new_stats:
+        with engine.begin() as conn:
+            for stmt in rebuild_stats():
+                conn.execute(stmt)
+
+
+if __name__ == "__main__":
+    from app.db.session import engine
+
+    migrate(engine)
+    print("database schema is up to date")
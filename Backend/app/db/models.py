@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, ForeignKey, Text, DateTime, Enum, func
+from sqlalchemy import String, Integer, ForeignKey, Text, DateTime, Enum, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 import enum
@@ -29,6 +29,8 @@ class User(Base):
 
 class Chat(Base):
     __tablename__ = "chats"
+    # ids are never handed out twice (sqlite reuses a deleted max rowid otherwise), ownership checks and etags rely on it
+    __table_args__ = (Index("ix_chats_user_id_created_at", "user_id", "created_at"), {"sqlite_autoincrement": True})
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -39,11 +41,14 @@ class Chat(Base):
     messages: Mapped[list["Message"]] = relationship("Message", back_populates="chat", cascade="all,delete-orphan")
 
     summary: Mapped["ChatSummary"] = relationship("ChatSummary", back_populates="chat", uselist=False, cascade="all,delete-orphan")
+    summary_jobs: Mapped[list["SummaryJob"]] = relationship("SummaryJob", cascade="all,delete-orphan")
+    segments: Mapped[list["ChatSegment"]] = relationship("ChatSegment", cascade="all,delete-orphan")
 
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_chat_id_id", "chat_id", "id"), {"sqlite_autoincrement": True})
 
     id: Mapped[int] = mapped_column(primary_key=True)
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"))
@@ -69,9 +74,11 @@ class ChatSummary(Base):
     __tablename__ = "chat_summaries"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"))
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), index=True, unique=True)
     lang: Mapped[Lang]
     summary: Mapped[str] = mapped_column(Text)
+    # last message folded into the summary, None for summaries written before this was tracked
+    covered_message_id: Mapped[int | None] = mapped_column(Integer)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -80,3 +87,104 @@ class ChatSummary(Base):
 
     chat: Mapped["Chat"] = relationship("Chat", back_populates="summary")
 
+
+class ChatSegment(Base):
+    # summary of the messages first_message_id..last_message_id that isn't folded into the chat summary yet
+    __tablename__ = "chat_segments"
+    __table_args__ = (Index("ix_chat_segments_chat_id_last", "chat_id", "last_message_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"))
+    first_message_id: Mapped[int]
+    last_message_id: Mapped[int]
+    lang: Mapped[Lang]
+    summary: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class SummaryJob(Base):
+    # "this chat has new messages", kept in the db so a restart doesn't lose it
+    __tablename__ = "summary_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"), index=True)
+    lang: Mapped[Lang]
+    model: Mapped[str | None] = mapped_column(String(64))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class UserStat(Base):
+    # counters behind /auth/profile, kept up to date in the same transaction as the writes (see app/db/stats.py)
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_chats: Mapped[int] = mapped_column(Integer, default=0)
+    total_messages: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class UserModelStat(Base):
+    __tablename__ = "user_model_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    model: Mapped[str] = mapped_column(String(64), primary_key=True)
+    assistant_messages: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class BatchStatus(str, enum.Enum):
+    queued="queued"
+    running="running"
+    done="done"
+    cancelled="cancelled"
+
+
+class BatchItemStatus(str, enum.Enum):
+    pending="pending"
+    done="done"
+    failed="failed"
+    cancelled="cancelled"
+
+
+class BatchJob(Base):
+    # POST /messages/batch, run in the background by app/messages/batch.py
+    __tablename__ = "batch_jobs"
+    __table_args__ = (Index("ix_batch_jobs_status_heartbeat_at", "status", "heartbeat_at"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    model: Mapped[str | None] = mapped_column(String(64))
+    cache: Mapped[bool] = mapped_column(default=True)
+    status: Mapped[BatchStatus] = mapped_column(default=BatchStatus.queued)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # touched by the worker running the job, a stale one means that worker died and another may take over
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    # new on every claim, the worker's writes only land while it still matches
+    claim: Mapped[str | None] = mapped_column(String(32))
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+
+class BatchItem(Base):
+    __tablename__ = "batch_items"
+    __table_args__ = (Index("ix_batch_items_job_id_idx", "job_id", "idx"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey("batch_jobs.id", ondelete="CASCADE"))
+    idx: Mapped[int] = mapped_column(Integer)  # position in the request
+    chat_id: Mapped[int | None] = mapped_column(ForeignKey("chats.id", ondelete="SET NULL"))
+    content: Mapped[str] = mapped_column(Text)
+    status: Mapped[BatchItemStatus] = mapped_column(default=BatchItemStatus.pending)
+    reply: Mapped[str | None] = mapped_column(Text)
+    model: Mapped[str | None] = mapped_column(String(64))  # who answered
+    message_id: Mapped[int | None] = mapped_column(Integer)  # the assistant message, when the item targets a chat
+    error: Mapped[str | None] = mapped_column(String(255))
+
+
+class Lease(Base):
+    # named lock with an expiry for background work that every worker process runs, see app/db/lease.py
+    __tablename__ = "leases"
+
+    name: Mapped[str] = mapped_column(String(128), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(128))
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
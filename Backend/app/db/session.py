@@ -1,8 +1,76 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import get_settings
+from app.core.metrics import instrument_engine
 
 settings = get_settings()
-connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(settings.DATABASE_URL, echo=False, future=True, connect_args=connect_args)
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if u.database in (None, "", ":memory:"):
+            # one shared in-memory connection, there is no pool to size
+            return options
+        if is_async:
+            # aiosqlite defaults to NullPool, a new connection (and thread, and pragmas) per session
+            options["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS}
+    options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW,
+                   pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS)
+    return options
+
+
+def sqlite_pragmas(engine):
+    # WAL lets readers run while one writer commits, synchronous=NORMAL only fsyncs at checkpoints
+    # (a power cut can lose the last commits, never corrupt the file). busy_timeout makes a second
+    # writer wait for the lock instead of failing with "database is locked"
+    pragmas = [
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE),
+    ]
+    pragmas = [(k, v) for k, v in pragmas if v not in ("", None)]
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _setup(engine, name: str):
+    if engine.dialect.name == "sqlite":
+        sqlite_pragmas(engine)
+    if settings.METRICS_ENABLED:
+        instrument_engine(engine, name)
+
+
+engine = create_engine(settings.DATABASE_URL, echo=False, future=True, **engine_options(settings.DATABASE_URL))
+_setup(engine, "sync")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url: str) -> str:
+    # same database as the sync engine, just through an asyncio driver
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend in ASYNC_DRIVERS and u.drivername != ASYNC_DRIVERS[backend]:
+        u = u.set(drivername=ASYNC_DRIVERS[backend])
+    return u.render_as_string(hide_password=False)
+
+
+async_engine = create_async_engine(async_url(settings.DATABASE_URL), echo=False,
+                                   **engine_options(settings.DATABASE_URL, is_async=True))
+_setup(async_engine.sync_engine, "async")
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
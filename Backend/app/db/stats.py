@@ -0,0 +1,115 @@
+"""Per-user counters for /auth/profile.
+
+The helpers only build statements; callers execute them in the transaction that
+inserts messages or deletes chats, so the counters can't drift from the data.
+
+Rebuild everything from the messages table with:
+
+    python -m app.db.stats backfill [--user-id ID]
+"""
+import argparse
+
+from sqlalchemy import delete, func, insert as core_insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.models import Chat, Message, Role, User, UserModelStat, UserStat
+
+
+def _upsert(dialect: str, model, keys: dict, deltas: dict):
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(model).values(**keys, **deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={k: getattr(model, k) + v for k, v in deltas.items()},
+    )
+
+
+def record_messages(dialect: str, user_id: int, messages: int, model: str | None = None,
+                    assistant_messages: int = 0, new_chats: int = 0) -> list:
+    stmts = [_upsert(dialect, UserStat, {"user_id": user_id}, {"total_chats": new_chats, "total_messages": messages})]
+    if model and assistant_messages:
+        stmts.append(_upsert(dialect, UserModelStat, {"user_id": user_id, "model": model},
+                             {"assistant_messages": assistant_messages}))
+    return stmts
+
+
+def record_chat_deleted(user_id: int, messages: int, per_model: dict[str, int]) -> list:
+    stmts = [
+        update(UserStat)
+        .where(UserStat.user_id == user_id)
+        .values(total_chats=UserStat.total_chats - 1, total_messages=UserStat.total_messages - messages)
+    ]
+    for model, n in per_model.items():
+        stmts.append(
+            update(UserModelStat)
+            .where(UserModelStat.user_id == user_id, UserModelStat.model == model)
+            .values(assistant_messages=UserModelStat.assistant_messages - n)
+        )
+    return stmts
+
+
+def chat_message_counts(chat_id: int):
+    # (model, role, count) rows for one chat, read before it is deleted
+    return (
+        select(Message.model, Message.role, func.count(Message.id))
+        .where(Message.chat_id == chat_id)
+        .group_by(Message.model, Message.role)
+    )
+
+
+def rebuild(user_id: int | None = None) -> list:
+    """Statements that recompute the counters from scratch, for everyone or one user.
+    Every user gets a user_stats row, zeros when they have no chats."""
+    chats = select(Chat.user_id, func.count(Chat.id).label("n")).group_by(Chat.user_id)
+    msgs = select(Chat.user_id, func.count(Message.id).label("n")).join(Message).group_by(Chat.user_id)
+    per_model = (
+        select(Chat.user_id, Message.model, func.count(Message.id))
+        .join(Message)
+        .where(Message.role == Role.assistant, Message.model.is_not(None))
+        .group_by(Chat.user_id, Message.model)
+    )
+    wipe_stats, wipe_models = delete(UserStat), delete(UserModelStat)
+    if user_id is not None:
+        chats, msgs, per_model = (q.where(Chat.user_id == user_id) for q in (chats, msgs, per_model))
+        wipe_stats = wipe_stats.where(UserStat.user_id == user_id)
+        wipe_models = wipe_models.where(UserModelStat.user_id == user_id)
+
+    chats, msgs = chats.subquery(), msgs.subquery()
+    totals = (
+        select(User.id, func.coalesce(chats.c.n, literal(0)), func.coalesce(msgs.c.n, literal(0)))
+        .select_from(
+            User.__table__
+            .outerjoin(chats, chats.c.user_id == User.id)
+            .outerjoin(msgs, msgs.c.user_id == User.id)
+        )
+    )
+    if user_id is not None:
+        totals = totals.where(User.id == user_id)
+    return [
+        wipe_stats,
+        wipe_models,
+        core_insert(UserStat).from_select(["user_id", "total_chats", "total_messages"], totals),
+        core_insert(UserModelStat).from_select(["user_id", "model", "assistant_messages"], per_model),
+    ]
+
+
+def main():
+    from app.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.stats")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for stmt in rebuild(args.user_id):
+            db.execute(stmt)
+        db.commit()
+        print(f"user stats rebuilt for {'user ' + str(args.user_id) if args.user_id else 'all users'}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,78 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.auth.principal import Principal, principal_cache
+from app.core.config import get_settings
+from app.core.rate_limit import get_quota, tightest
 from app.core.security import decode_token
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
 from app.db.models import User
 
 security = HTTPBearer(auto_error=True)
+settings = get_settings()
 
 def get_db():
     db = SessionLocal()
     try: yield db
     finally: db.close()
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security),
-                     db: Session = Depends(get_db)) -> User:
-    token = creds.credentials
+async def get_async_db():
+    # the session only opens a connection once it runs a query, so handing one out is free
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _decode(token: str) -> dict:
     try:
-        payload = decode_token(token)
-        email = payload.get("sub")
+        return decode_token(token)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = db.query(User).filter(User.email==email).first()
+
+def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security),
+                     db: Session = Depends(get_db)) -> User:
+    payload = _decode(creds.credentials)
+    if payload.get("uid") is not None:
+        user = db.get(User, payload["uid"])
+    else:
+        user = db.query(User).filter(User.email==payload.get("sub")).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+async def get_principal(creds: HTTPAuthorizationCredentials = Depends(security),
+                        db: AsyncSession = Depends(get_async_db)) -> Principal:
+    return await principal_for_token(creds.credentials, db)
+
+async def principal_for_token(token: str, db: AsyncSession) -> Principal:
+    # raises a 401 HTTPException, also used by /ws which has no Authorization header
+    principal = principal_cache.get(token)
+    if principal:
+        return principal
+
+    payload = _decode(token)
+    if payload.get("uid") is not None:
+        user = await db.get(User, payload["uid"])
+    else:
+        # tokens issued before the uid claim existed
+        user = await db.scalar(select(User).where(User.email == payload.get("sub")))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    principal = Principal.from_user(user)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+async def get_current_user_async(principal: Principal = Depends(get_principal),
+                                 db: AsyncSession = Depends(get_async_db)) -> User:
+    # for the few endpoints that need more than the principal
+    user = await db.get(User, principal.id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
+
+async def check_quota(request: Request, principal: Principal = Depends(get_principal)) -> Principal:
+    # raises QuotaExceeded (429), otherwise the middleware in main turns request.state.rate_limit into headers
+    if settings.RATE_LIMIT_ENABLED:
+        request.state.rate_limit = tightest(await get_quota().check(principal.id))
+    return principal
@@ -1,3 +1,7 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import anyio
 from fastapi import FastAPI, Request, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter
@@ -7,20 +11,51 @@ from slowapi.middleware import SlowAPIMiddleware
 from fastapi.responses import JSONResponse
 
 from app.core.config import get_settings
-from app.db.session import engine
-from app.db.base import Base
+from app.db.session import async_engine, engine
+from app.db.migrate import migrate
 from app.auth.router import router as auth_router
 from app.chats.router import router as chats_router
 from app.ai.router import router as ai_router
 from app.messages.router import router as messages_router
+from app.messages.ws import router as ws_router
+from app.ai.summary_worker import summary_worker
+from app.messages.batch import batch_runner
+from app.ai.profile_summaries import run_periodically as run_profile_summaries
+from app.ai.registry import get_registry, close_registry
+from app.ai.limits import ProviderBusy
+from app.core.security import HashingBusy, password_pool
+from app.core.metrics import MetricsMiddleware, metrics_response, register_runtime_collector
+from app.core.rate_limit import QuotaExceeded, close_quota, get_quota, headers as rate_limit_headers
 
 settings = get_settings()
 
-Base.metadata.create_all(bind=engine)
-
 limiter = Limiter(key_func=get_remote_address)
 
-app = FastAPI(title=settings.APP_NAME)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_AUTO_MIGRATE:
+        await anyio.to_thread.run_sync(migrate, engine)
+    get_registry()
+    if settings.RATE_LIMIT_ENABLED:
+        get_quota()
+    await summary_worker.start()
+    await batch_runner.start()
+    profile_job = None
+    if settings.PROFILE_SUMMARY_INTERVAL_SECONDS > 0:
+        profile_job = asyncio.create_task(run_profile_summaries(settings.PROFILE_SUMMARY_INTERVAL_SECONDS))
+    yield
+    if profile_job:
+        profile_job.cancel()
+    await batch_runner.stop()
+    await summary_worker.stop()
+    await close_registry()
+    await close_quota()
+    await async_engine.dispose()
+    password_pool.shutdown()
+
+
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 app.state.limiter = limiter
 
 app.add_middleware(SlowAPIMiddleware)
@@ -32,6 +67,31 @@ def rate_limit_handler(request: Request, exc: RateLimitExceeded):
         content={"detail": "Too many requests, please slow down."}
     )
 
+@app.exception_handler(QuotaExceeded)
+def quota_exceeded_handler(request: Request, exc: QuotaExceeded):
+    quota = get_quota()
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"{exc.decision.bucket.name.capitalize()} quota used up, please slow down."},
+        headers={**rate_limit_headers(exc.decision, [quota.requests, quota.tokens]), "Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(ProviderBusy)
+def provider_busy_handler(request: Request, exc: ProviderBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI provider is busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(HashingBusy)
+def hashing_busy_handler(request: Request, exc: HashingBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-ins right now, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.BACKEND_CORS_ORIGINS or ["*"],
@@ -52,6 +112,7 @@ api_router.include_router(auth_router)
 api_router.include_router(chats_router)
 api_router.include_router(ai_router)
 api_router.include_router(messages_router)
+api_router.include_router(ws_router)
 
 app.include_router(api_router)
 
@@ -59,4 +120,18 @@ app.include_router(api_router)
 async def add_lang_header(request: Request, call_next):
     response = await call_next(request)
     response.headers["Content-Language"] = request.headers.get("X-User-Lang", settings.DEFAULT_LANG)
+    decision = getattr(request.state, "rate_limit", None)
+    if decision is not None:
+        quota = get_quota()
+        response.headers.update(rate_limit_headers(decision, [quota.requests, quota.tokens]))
     return response
+
+if settings.METRICS_ENABLED:
+    # added last so it is the outermost middleware and times everything below it
+    app.add_middleware(MetricsMiddleware)
+    register_runtime_collector()
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        # async on purpose: the threadpool gauges are read from the event loop
+        return metrics_response()
@@ -0,0 +1,417 @@
+"""Batch completion jobs behind POST /messages/batch.
+
+The request stores a job row and one row per item, then returns; nothing waits on the socket.
+Every worker process runs a BatchRunner. Queued jobs are claimed with an UPDATE ... WHERE
+status = 'queued', so exactly one process runs each. Items go through the provider registry
+like any send, at most BATCH_CONCURRENCY[vendor] calls per vendor across the process's jobs,
+and pause while the user's token bucket is in debt. Items that target the same chat run one at a
+time in idx order, each after the previous one's turn is written, so its context includes it.
+
+Results are written BATCH_WRITE_SIZE at a time (or every BATCH_FLUSH_SECONDS): the item rows,
+and for items that target a chat the two messages, their search index rows, summary jobs and
+counters, in one transaction. That write also refreshes the job's heartbeat; a running job
+whose heartbeat goes stale is taken over by the next sweep and only its unwritten items rerun.
+Each claim stores a new token on the job and every write checks it, so a stalled worker whose
+job was taken over stops at its next write instead of running the items a second time.
+"""
+import asyncio
+import logging
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.ai.context import build_context
+from app.ai.limits import LimitedProvider, ProviderBusy
+from app.ai.registry import get_registry
+from app.ai.router import provider_from_name
+from app.ai.summary_worker import enqueue_summary, summary_worker
+from app.core.config import get_settings
+from app.core.lang_detect import detect_lang
+from app.core.rate_limit import get_quota
+from app.db.models import (
+    BatchItem, BatchItemStatus, BatchJob, BatchStatus, Chat, Lang, Message, Role, User,
+)
+from app.db.session import AsyncSessionLocal
+from app.db.stats import record_messages
+from app.messages.search import index_messages
+from app.messages.turns import charge_tokens
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ACTIVE = (BatchStatus.queued, BatchStatus.running)
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+async def create_job(db: AsyncSession, user_id: int, model: str | None, cache: bool,
+                     items: list[tuple[str, int | None]]) -> BatchJob:
+    """items are (content, chat_id or None). Raises InvalidBatch on empty content or a chat the user doesn't own."""
+    items = [(content.strip(), chat_id) for content, chat_id in items]
+    for i, (content, _) in enumerate(items):
+        if not content:
+            raise InvalidBatch(f"item {i}: content is required")
+    chat_ids = {chat_id for _, chat_id in items if chat_id is not None}
+    if chat_ids:
+        owned = set((await db.scalars(
+            select(Chat.id).where(Chat.id.in_(chat_ids), Chat.user_id == user_id)
+        )).all())
+        if chat_ids - owned:
+            raise InvalidBatch(f"chat {min(chat_ids - owned)} not found")
+
+    job = BatchJob(user_id=user_id, model=model, cache=cache, status=BatchStatus.queued, total=len(items),
+                   completed=0, failed=0)
+    db.add(job)
+    await db.flush()
+    await db.execute(insert(BatchItem), [
+        {"job_id": job.id, "idx": i, "chat_id": chat_id, "content": content, "status": BatchItemStatus.pending}
+        for i, (content, chat_id) in enumerate(items)
+    ])
+    await db.commit()
+    batch_runner.notify(job.id)
+    return job
+
+
+async def cancel_job(db: AsyncSession, job: BatchJob):
+    # results that are already written stay, the rest is never run
+    if job.status not in ACTIVE:
+        return
+    job.status = BatchStatus.cancelled
+    job.finished_at = datetime.now(timezone.utc)
+    await db.execute(
+        update(BatchItem)
+        .where(BatchItem.job_id == job.id, BatchItem.status == BatchItemStatus.pending)
+        .values(status=BatchItemStatus.cancelled)
+    )
+    await db.commit()
+
+
+async def watch(job_id: int, interval: float = 1.0) -> AsyncIterator[BatchJob]:
+    """Yields the job whenever its counters or status change, until it is finished.
+    Polls the row, so it works whichever process runs the job."""
+    last = None
+    while True:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(BatchJob, job_id)
+        if job is None:
+            return
+        state = (job.status, job.completed, job.failed)
+        if state != last:
+            last = state
+            yield job
+        if job.status not in ACTIVE:
+            return
+        await asyncio.sleep(interval)
+
+
+@dataclass(slots=True)
+class _Result:
+    item_id: int
+    chat_id: int | None
+    content: str
+    lang: Lang
+    reply: str | None = None
+    model: str | None = None
+    error: str | None = None
+    written: asyncio.Event | None = None  # set once stored, the next item on the same chat waits for it
+
+
+class BatchRunner:
+    def __init__(self, max_jobs: int = 4, poll_interval: float = 30.0, stale_after: float = 120.0):
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._queued: set[int] = set()
+        self._running: set[int] = set()
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def notify(self, job_id: int):
+        if job_id not in self._queued and job_id not in self._running:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.max_jobs)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _claimable(self, now: datetime):
+        stale = now - timedelta(seconds=self.stale_after)
+        return or_(
+            BatchJob.status == BatchStatus.queued,
+            and_(BatchJob.status == BatchStatus.running, BatchJob.heartbeat_at < stale),
+        )
+
+    async def _sweep(self):
+        # jobs queued by other processes, or left behind by a worker that died
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    ids = (await db.scalars(
+                        select(BatchJob.id).where(self._claimable(datetime.now(timezone.utc)))
+                        .order_by(BatchJob.id).limit(100)
+                    )).all()
+                for job_id in ids:
+                    self.notify(job_id)
+            except Exception:
+                logger.exception("batch sweep failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self, job_id: int) -> str | None:
+        # the claim token, None when the job isn't claimable (anymore)
+        now = datetime.now(timezone.utc)
+        claim = uuid.uuid4().hex
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(BatchJob).where(BatchJob.id == job_id, self._claimable(now))
+                .values(status=BatchStatus.running, heartbeat_at=now, claim=claim)
+            )
+            await db.commit()
+        return claim if result.rowcount == 1 else None
+
+    async def _consume(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            self._running.add(job_id)
+            try:
+                if claim := await self._claim(job_id):
+                    await self.run(job_id, claim)
+            except Exception:
+                # the heartbeat goes stale and a later sweep picks the job up again
+                logger.exception("batch job %s failed", job_id)
+            finally:
+                self._running.discard(job_id)
+
+    def _semaphore(self, model: str | None) -> asyncio.Semaphore:
+        prov = get_registry().get(model)
+        vendor = prov.limiter.name if isinstance(prov, LimitedProvider) else getattr(prov, "name", "")
+        if vendor not in self._semaphores:
+            self._semaphores[vendor] = asyncio.Semaphore(settings.BATCH_CONCURRENCY.get(vendor, 4))
+        return self._semaphores[vendor]
+
+    async def run(self, job_id: int, claim: str):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(BatchJob, job_id)
+            fallback = await db.scalar(select(User.preferred_lang).where(User.id == job.user_id))
+            items = (await db.execute(
+                select(BatchItem.id, BatchItem.chat_id, BatchItem.content)
+                .where(BatchItem.job_id == job_id, BatchItem.status == BatchItemStatus.pending)
+                .order_by(BatchItem.idx)
+            )).all()
+
+        slots = self._semaphore(job.model)
+        results: asyncio.Queue[_Result] = asyncio.Queue()
+        calls: set[asyncio.Task] = set()
+
+        async def one(item, written: asyncio.Event | None = None):
+            try:
+                result = await self._complete(job, fallback or Lang.en, item)
+            except Exception:
+                # a failed read, quota check or write of the charge still has to finish the item,
+                # or the job never reaches done
+                logger.exception("batch item %s failed", item.id)
+                result = _Result(item.id, item.chat_id, item.content, fallback or Lang.en, error="internal error")
+            finally:
+                slots.release()
+            result.written = written
+            results.put_nowait(result)
+
+        async def in_order(chat_items):
+            # items on one chat run one after another, each built on the turn stored before it
+            for i, item in enumerate(chat_items):
+                if i:
+                    await slots.acquire()
+                if i == len(chat_items) - 1:
+                    await one(item)
+                else:
+                    written = asyncio.Event()
+                    await one(item, written)
+                    await written.wait()
+
+        units: dict[tuple, list] = {}
+        for item in items:
+            key = ("chat", item.chat_id) if item.chat_id is not None else ("item", item.id)
+            units.setdefault(key, []).append(item)
+
+        async def feed():
+            for unit in units.values():
+                await slots.acquire()
+                task = asyncio.create_task(in_order(unit) if len(unit) > 1 else one(unit[0]))
+                calls.add(task)
+                task.add_done_callback(calls.discard)
+
+        feeder = asyncio.create_task(feed())
+        left = len(items)
+        try:
+            while left:
+                batch = await self._collect(results, min(left, settings.BATCH_WRITE_SIZE))
+                left -= len(batch)
+                if not await self._write(job, claim, batch):
+                    return  # cancelled, or taken over by another worker
+                for r in batch:
+                    if r.written is not None:
+                        r.written.set()
+            async with AsyncSessionLocal() as db:
+                now = datetime.now(timezone.utc)
+                await db.execute(
+                    update(BatchJob)
+                    .where(BatchJob.id == job_id, BatchJob.status == BatchStatus.running, BatchJob.claim == claim)
+                    .values(status=BatchStatus.done, finished_at=now, heartbeat_at=now)
+                )
+                await db.commit()
+        finally:
+            feeder.cancel()
+            for task in list(calls):
+                task.cancel()
+            await asyncio.gather(feeder, *calls, return_exceptions=True)
+
+    async def _collect(self, results: asyncio.Queue, n: int) -> list[_Result]:
+        # up to n results, or whatever arrived within BATCH_FLUSH_SECONDS (possibly none: the write
+        # still refreshes the heartbeat and notices a cancel)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.BATCH_FLUSH_SECONDS
+        batch = []
+        while len(batch) < n:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                result = await asyncio.wait_for(results.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(result)
+            if result.written is not None:
+                # the next item on that chat waits for this write, take what is ready and flush now
+                while len(batch) < n and not results.empty():
+                    batch.append(results.get_nowait())
+                break
+        return batch
+
+    async def _wait_for_tokens(self, user_id: int):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        quota = get_quota()
+        while (decision := await quota.tokens_left(user_id)).tokens < 0:
+            await asyncio.sleep(decision.retry_after(0))
+
+    async def _complete(self, job: BatchJob, fallback: Lang, item) -> _Result:
+        result = _Result(item.id, item.chat_id, item.content, detect_lang(item.content, fallback=fallback))
+        prov = provider_from_name(job.model, cache=job.cache)
+        if prov is None:
+            result.error = "AI provider/model not available"
+            return result
+        # the same context a send on that chat would get, read before the call so no connection is held during it
+        async with AsyncSessionLocal() as db:
+            chat = None
+            if item.chat_id is not None:
+                # owner checked again: the chat may have been deleted since the job was submitted, and a write only
+                # ever goes to a chat of the job's user
+                chat = await db.scalar(
+                    select(Chat).options(selectinload(Chat.summary))
+                    .where(Chat.id == item.chat_id, Chat.user_id == job.user_id)
+                )
+                if chat is None:
+                    result.error = "chat was deleted"
+                    return result
+            messages = await build_context(db, chat, item.content, result.lang, prov.name)
+
+        for attempt in range(settings.BATCH_MAX_ATTEMPTS):
+            await self._wait_for_tokens(job.user_id)
+            try:
+                reply = await prov.chat(messages, lang=result.lang.value)
+            except ProviderBusy:
+                # interactive traffic has the provider's slots, back off and try again
+                await asyncio.sleep(min(30, 2 ** attempt))
+                continue
+            except Exception:
+                logger.warning("batch item %s failed", item.id, exc_info=True)
+                result.error = "AI provider failed"
+                return result
+            await charge_tokens(job.user_id, messages, reply)
+            result.reply, result.model = reply, prov.name
+            return result
+        result.error = "AI provider is busy"
+        return result
+
+    async def _write(self, job: BatchJob, claim: str, batch: list[_Result]) -> bool:
+        """Stores a batch of results. False when the job was cancelled or taken over meanwhile (the batch is dropped)."""
+        async with AsyncSessionLocal() as db:
+            # the heartbeat goes first: it only matches while the claim is ours, and it keeps the row locked
+            # until the batch commits, so a takeover can't slip in between the check and the writes
+            claimed = await db.execute(
+                update(BatchJob)
+                .where(BatchJob.id == job.id, BatchJob.status == BatchStatus.running, BatchJob.claim == claim)
+                .values(heartbeat_at=datetime.now(timezone.utc))
+            )
+            if claimed.rowcount != 1:
+                await db.rollback()
+                return False
+
+            targets = {r.chat_id for r in batch if r.reply is not None and r.chat_id is not None}
+            alive = set((await db.scalars(
+                select(Chat.id).where(Chat.id.in_(targets), Chat.user_id == job.user_id)
+            )).all()) if targets else set()
+            turns = []
+            for r in batch:
+                if r.reply is None or r.chat_id is None:
+                    continue
+                if r.chat_id not in alive:
+                    r.reply, r.error = None, "chat was deleted"
+                    continue
+                turns.append((r, Message(chat_id=r.chat_id, role=Role.user, content=r.content, lang=r.lang),
+                              Message(chat_id=r.chat_id, role=Role.assistant, content=r.reply, model=r.model,
+                                      lang=r.lang)))
+            if turns:
+                msgs = [m for _, user_msg, assistant_msg in turns for m in (user_msg, assistant_msg)]
+                db.add_all(msgs)
+                await index_messages(db, job.user_id, msgs)
+                for r, _, _ in turns:
+                    enqueue_summary(db, r.chat_id, r.lang, r.model)
+                dialect = db.bind.dialect.name
+                stmts = record_messages(dialect, job.user_id, messages=len(msgs))
+                for model, n in Counter(r.model for r, _, _ in turns).items():
+                    stmts += record_messages(dialect, job.user_id, messages=0, model=model, assistant_messages=n)
+                for stmt in stmts:
+                    await db.execute(stmt)
+
+            message_ids = {r.item_id: assistant_msg.id for r, _, assistant_msg in turns}
+            if batch:
+                await db.execute(update(BatchItem), [
+                    {"id": r.item_id, "status": BatchItemStatus.failed if r.error else BatchItemStatus.done,
+                     "reply": r.reply, "model": r.model, "error": r.error, "message_id": message_ids.get(r.item_id)}
+                    for r in batch
+                ])
+            failed = sum(1 for r in batch if r.error)
+            await db.execute(
+                update(BatchJob).where(BatchJob.id == job.id).values(
+                    completed=BatchJob.completed + len(batch) - failed,
+                    failed=BatchJob.failed + failed,
+                )
+            )
+            await db.commit()
+        for chat_id in {r.chat_id for r, _, _ in turns}:
+            summary_worker.notify(chat_id)
+        return True
+
+
+batch_runner = BatchRunner(
+    max_jobs=settings.BATCH_MAX_JOBS,
+    poll_interval=settings.BATCH_POLL_SECONDS,
+    stale_after=settings.BATCH_STALE_SECONDS,
+)
@@ -1,116 +1,261 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from langdetect import detect
-from app.deps import get_db, get_current_user
-from app.db.models import Chat, Message, Role, Lang, UserSummary
-from app.ai.summarizer import update_chat_summary,summarize_history
+import json
+
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.deps import check_quota, get_async_db, get_principal
+from app.db.models import BatchItem, BatchItemStatus, BatchJob, Chat, Lang, UserSummary
+from app.db.session import AsyncSessionLocal
+from app.ai.summarizer import summarize_history
 from app.ai.router import provider_from_name
+from app.ai.limits import ProviderBusy
+from app.ai.context import build_context
 from app.core.i18n import t
+from app.core.config import get_settings
+from app.core.lang_detect import detect_lang
+from app.messages.batch import InvalidBatch, cancel_job, create_job, watch as watch_job
+from app.messages.search import search as search_messages
+from app.messages.turns import ChatDeleted, assistant_message_out, charge_tokens, save_turn, user_message_out
 
 from .schemas import (
     SendMessageRequest,
     SendMessageResponse,
-    UserMessageResponse,
-    AssistantMessageResponse,
+    SearchHit,
+    SearchResponse,
+    BatchRequest,
+    BatchJobResponse,
+    BatchItemResponse,
+    BatchItemsResponse,
 )
 
 router = APIRouter(prefix="/messages", tags=["messages"])
+settings = get_settings()
 
-@router.post("/send", response_model=SendMessageResponse)
-async def send_message(
-    payload: SendMessageRequest,
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
-):
-    chat_id = payload.chat_id
-    content = payload.content.strip()
-    model_name = payload.model
 
+def _detect_lang(content: str, user) -> Lang:
+    # i dont know if i should detect the lang or use user preferred lang , i will do this for now
+    return detect_lang(content, fallback=user.preferred_lang)
+
+
+async def _prepare(payload: SendMessageRequest, db: AsyncSession, user):
+    content = payload.content.strip()
     if not content:
         raise HTTPException(400, detail="content is required")
 
-
-    prov = provider_from_name(model_name)
+    prov = provider_from_name(payload.model, cache=payload.cache)
     if not prov:
         raise HTTPException(503, detail="AI provider/model not available")
-    # i dont know if i should detect the lang or use user preferred lang , i will do this for now
-    try:
-        detected = detect(content)
-        lang = Lang(detected) if detected in ["en", "ar"] else user.preferred_lang
-    except Exception:
-        lang = user.preferred_lang
-
-
-    if not chat_id:
-        title = " ".join(content.split()[:6]) + ("..." if len(content.split()) > 6 else "")
-        chat = Chat(user_id=user.id, title=title or "New Chat")
-        db.add(chat)
-        db.flush()
-        chat_id = chat.id
-    else:
-        chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == user.id).first()
+
+    lang = _detect_lang(content, user)
+
+    chat = None
+    if payload.chat_id:
+        chat = await db.scalar(
+            select(Chat)
+            .options(selectinload(Chat.summary))
+            .where(Chat.id == payload.chat_id, Chat.user_id == user.id)
+        )
         if not chat:
             raise HTTPException(404, detail="Chat not found")
 
+    return content, prov, lang, chat
 
-    user_msg = Message(chat_id=chat.id, role=Role.user, content=content, model=None, lang=lang)
-    db.add(user_msg)
-    db.flush()
-
-    if chat.summary:
-        messages = [
-            {"role": "system", "content": "Answer in Arabic" if lang == Lang.ar else "Answer in English"},
-            {"role": "assistant", "content": chat.summary.summary},
-            {"role": "user", "content": content},
-        ]
-    else:
-        history = (
-            db.query(Message)
-            .filter(Message.chat_id == chat.id)
-            .order_by(Message.id.asc())
-            .all()
-        )
-        messages = [{"role": m.role.value, "content": m.content} for m in history]
-        messages.insert(
-            0,
-            {"role": "system", "content": "Answer in Arabic" if lang == Lang.ar else "Answer in English"},
-        )
 
-    reply = await prov.chat(messages, lang=lang.value)
+@router.get("/search", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    order: Literal["relevance", "recent"] = "relevance",
+    chat_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_principal),
+):
+    # the query language picks the postgres stemmer, sqlite stems english regardless
+    lang = detect_lang(q, fallback=user.preferred_lang)
+    try:
+        rows, next_cursor = await search_messages(db, user.id, q, lang, limit, cursor, order, chat_id)
+    except ValueError:
+        raise HTTPException(400, detail="invalid cursor")
+    return SearchResponse(
+        items=[
+            SearchHit(
+                message_id=r["id"],
+                chat_id=r["chat_id"],
+                chat_title=r["chat_title"],
+                role=r["role"],
+                lang=r["lang"],
+                snippet=r["snippet"],
+                score=r["score"],
+                created_at=r["created_at"],
+            )
+            for r in rows
+        ],
+        next_cursor=next_cursor,
+    )
 
-    assistant_msg = Message(chat_id=chat.id, role=Role.assistant, content=reply, model=prov.name, lang=lang)
-    db.add(assistant_msg)
-    db.flush()
 
+@router.post("/send", response_model=SendMessageResponse, dependencies=[Depends(check_quota)])
+async def send_message(
+    payload: SendMessageRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_principal),
+):
+    content, prov, lang, chat = await _prepare(payload, db, user)
 
-    summary_text = await update_chat_summary(
-        prov=prov,
-        chat=chat,
-        db=db,
-        lang=lang.value,
-        user_msg=content,
-        assistant_msg=reply,
-    )
+    messages = await build_context(db, chat, content, lang, prov.name)
+    summary_text = chat.summary.summary if chat and chat.summary else None
+    # nothing is written until the llm has answered: an open write transaction would hold sqlite's
+    # lock (or a pooled postgres connection) for the whole call. this ends the read one too
+    await db.commit()
+
+    reply = await prov.chat(messages, lang=lang.value)
+    await charge_tokens(user.id, messages, reply)
+    try:
+        chat, user_msg, assistant_msg = await save_turn(db, user.id, chat, content, lang, prov.name, reply)
+    except ChatDeleted:
+        raise HTTPException(404, detail="Chat not found")
 
-    db.commit()
-    
     # this is too much to return , maybe we can return less data later otherwise frontend will handle it
     return SendMessageResponse(
         chat_id=chat.id,
         chat_title=chat.title,
-        user_message=UserMessageResponse(
-            id=user_msg.id,
-            role=user_msg.role.value,
-            content=user_msg.content,
-            lang=user_msg.lang.value,
-        ),
-        assistant_message=AssistantMessageResponse(
-            id=assistant_msg.id,
-            role=assistant_msg.role.value,
-            content=assistant_msg.content,
-            model=assistant_msg.model,
-            lang=assistant_msg.lang.value,
-        ),
+        user_message=user_message_out(user_msg),
+        assistant_message=assistant_message_out(assistant_msg),
         chat_summary=summary_text,
     )
 
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/send/stream", dependencies=[Depends(check_quota)])
+async def send_message_stream(
+    payload: SendMessageRequest,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_principal),
+):
+    # validation happens before the stream starts so errors still come back as normal status codes
+    content, prov, lang, chat = await _prepare(payload, db, user)
+    messages = await build_context(db, chat, content, lang, prov.name)
+    chat_id = chat.id if chat else None
+    summary_text = chat.summary.summary if chat and chat.summary else None
+    user_id = user.id
+
+    async def events():
+        parts = []
+        try:
+            async for delta in prov.chat_stream(messages, lang=lang.value):
+                parts.append(delta)
+                yield _sse("token", {"delta": delta})
+        except ProviderBusy:
+            yield _sse("error", {"detail": "AI provider is busy, please retry shortly."})
+            return
+        except Exception:
+            yield _sse("error", {"detail": "AI provider failed"})
+            return
+
+        reply = "".join(parts)
+        await charge_tokens(user_id, messages, reply)
+
+        # the request session is gone by now, so the generator persists with its own one
+        async with AsyncSessionLocal() as s:
+            c = await s.get(Chat, chat_id) if chat_id else None
+            try:
+                if chat_id and c is None:
+                    raise ChatDeleted
+                c, user_msg, assistant_msg = await save_turn(s, user_id, c, content, lang, prov.name, reply)
+            except ChatDeleted:
+                # deleted while the reply was streaming
+                yield _sse("error", {"detail": "Chat not found"})
+                return
+
+        yield _sse("done", {
+            "chat_id": c.id,
+            "chat_title": c.title,
+            "user_message": user_message_out(user_msg).model_dump(),
+            "assistant_message": assistant_message_out(assistant_msg).model_dump(),
+            "chat_summary": summary_text,
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/batch", response_model=BatchJobResponse, status_code=202, dependencies=[Depends(check_quota)])
+async def create_batch(payload: BatchRequest, db: AsyncSession = Depends(get_async_db), user=Depends(get_principal)):
+    # returns once the job is stored, poll GET /messages/batch/{id} or follow /messages/batch/{id}/events
+    if len(payload.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(413, detail=f"at most {settings.BATCH_MAX_ITEMS} items per batch")
+    try:
+        job = await create_job(db, user.id, payload.model, payload.cache,
+                               [(item.content, item.chat_id) for item in payload.items])
+    except InvalidBatch as e:
+        raise HTTPException(422, detail=str(e))
+    return job
+
+
+async def _own_job(db: AsyncSession, job_id: int, user_id: int) -> BatchJob:
+    job = await db.scalar(select(BatchJob).where(BatchJob.id == job_id, BatchJob.user_id == user_id))
+    if not job:
+        raise HTTPException(404, detail="Batch not found")
+    return job
+
+
+@router.get("/batch/{job_id}", response_model=BatchJobResponse)
+async def get_batch(job_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_principal)):
+    return await _own_job(db, job_id, user.id)
+
+
+@router.get("/batch/{job_id}/items", response_model=BatchItemsResponse)
+async def get_batch_items(
+    job_id: int,
+    after: int = Query(-1, description="idx of the last item of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Literal["pending", "done", "failed", "cancelled"] | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_principal),
+):
+    await _own_job(db, job_id, user.id)
+    q = select(BatchItem).where(BatchItem.job_id == job_id, BatchItem.idx > after)
+    if status:
+        q = q.where(BatchItem.status == BatchItemStatus(status))
+    items = (await db.scalars(q.order_by(BatchItem.idx).limit(limit + 1))).all()
+    more = len(items) > limit
+    items = items[:limit]
+    return BatchItemsResponse(
+        items=[BatchItemResponse.model_validate(i) for i in items],
+        next_cursor=items[-1].idx if more else None,
+    )
+
+
+@router.post("/batch/{job_id}/cancel", response_model=BatchJobResponse)
+async def cancel_batch(job_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_principal)):
+    job = await _own_job(db, job_id, user.id)
+    await cancel_job(db, job)
+    return job
+
+
+@router.get("/batch/{job_id}/events")
+async def batch_events(job_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_principal)):
+    # a "progress" event whenever the counters move, then "done" with the final state
+    await _own_job(db, job_id, user.id)
+
+    async def events():
+        async for job in watch_job(job_id):
+            data = BatchJobResponse.model_validate(job).model_dump(mode="json")
+            yield _sse("progress" if job.status.value in ("queued", "running") else "done", data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 from typing import Optional
 
 
@@ -6,6 +7,12 @@ class SendMessageRequest(BaseModel):
     chat_id: Optional[int] = None
     content: str
     model: str
+    cache: bool = True  # false forces a fresh completion
+
+class SendFrame(SendMessageRequest):
+    # /ws: "id" is the client's handle on this generation, echoed on every frame it produces
+    id: str = Field(min_length=1, max_length=64)
+
 
 class UserMessageResponse(BaseModel):
     id: int
@@ -27,4 +34,64 @@ class SendMessageResponse(BaseModel):
     chat_title: str
     user_message: UserMessageResponse
     assistant_message: AssistantMessageResponse
-    chat_summary: str
+    chat_summary: Optional[str] = None  # last committed summary, the new one is computed in the background
+
+
+class SearchHit(BaseModel):
+    message_id: int
+    chat_id: int
+    chat_title: str
+    role: str
+    lang: str
+    snippet: str  # html-escaped message text, matches wrapped in <mark></mark>
+    score: float
+    created_at: datetime
+
+
+class SearchResponse(BaseModel):
+    items: list[SearchHit]
+    next_cursor: Optional[str] = None
+
+
+class BatchItemRequest(BaseModel):
+    content: str = Field(min_length=1)
+    chat_id: Optional[int] = None  # continue this chat (its context is used and the exchange is saved into it)
+
+
+class BatchRequest(BaseModel):
+    model: str
+    cache: bool = True
+    items: list[BatchItemRequest] = Field(min_length=1)
+
+
+class BatchJobResponse(BaseModel):
+    id: int
+    status: str
+    model: Optional[str] = None
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BatchItemResponse(BaseModel):
+    idx: int
+    chat_id: Optional[int] = None
+    content: str
+    status: str
+    reply: Optional[str] = None
+    model: Optional[str] = None
+    message_id: Optional[int] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BatchItemsResponse(BaseModel):
+    items: list[BatchItemResponse]
+    next_cursor: Optional[int] = None  # pass back as ?after=
@@ -0,0 +1,319 @@
+"""Full-text index over messages.
+
+SQLite: an FTS5 table (porter stemming on top of unicode61), one row per message with
+rowid = message id. The owner is indexed as a "u<id>" token so a user's search intersects
+posting lists instead of filtering every match.
+Postgres: a message_search table with an english + arabic tsvector and a GIN index.
+
+Text is normalized in python before it is indexed or searched (arabic diacritics, tatweel,
+alef/yaa/hamza variants), so both backends see the same forms. The backends only say where
+the matches are; snippets are cut from the stored message text, html-escaped, with the
+matches wrapped in <mark>.
+
+The index is written in the same transaction as the messages. Rebuild it with:
+
+    python -m app.messages.search reindex
+"""
+import argparse
+import html
+import math
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Lang, Message
+
+# harakat, superscript alef, quranic marks and tatweel are dropped, letter variants folded
+_ARABIC_FOLD = {c: None for c in range(0x064B, 0x0660)}
+_ARABIC_FOLD.update({0x0670: None, 0x0640: None})
+_ARABIC_FOLD.update({c: None for c in range(0x06D6, 0x06EE)})
+_ARABIC_FOLD.update({ord(a): b for a, b in {
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+}.items()})
+
+# the backends mark hits with these, html is only added once the text around them is escaped
+_HIT_START, _HIT_END = "\ue000", "\ue001"
+_ARABIC_FOLD.update({ord(_HIT_START): None, ord(_HIT_END): None})
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+MARK_START, MARK_END = "<mark>", "</mark>"
+SNIPPET_CHARS = 200
+
+
+def normalize(text_: str) -> str:
+    return text_.translate(_ARABIC_FOLD)
+
+
+def _fts_query(q: str, user_id: int) -> str | None:
+    # user input never reaches the fts5 parser as syntax: every word is a quoted phrase,
+    # all of them have to match and the last one also matches as a prefix (search as you type)
+    words = _WORD.findall(normalize(q))
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += " *"
+    return f"owner:u{user_id} AND body:({' '.join(terms)})"
+
+
+def _pg_config(lang: Lang) -> str:
+    return "arabic" if lang == Lang.ar else "english"
+
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5("
+    "body, owner, chat_id UNINDEXED, tokenize = 'porter unicode61 remove_diacritics 2')"
+)
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS message_search ("
+    " message_id integer PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,"
+    " user_id integer NOT NULL, chat_id integer NOT NULL, body text NOT NULL, tsv tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_message_search_tsv ON message_search USING gin (tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_message_search_user_id ON message_search (user_id)",
+]
+
+
+def index_table(dialect: str) -> str:
+    return "message_search" if dialect == "postgresql" else "message_fts"
+
+
+def ensure_index(conn) -> bool:
+    """Create the index if missing (sync connection). Returns True when it was just created."""
+    dialect = conn.dialect.name
+    table = index_table(dialect)
+    existed = conn.dialect.has_table(conn, table)
+    if dialect == "postgresql":
+        for ddl in POSTGRES_DDL:
+            conn.execute(text(ddl))
+    else:
+        conn.execute(text(SQLITE_DDL))
+    return not existed
+
+
+def _insert_stmt(dialect: str):
+    if dialect == "postgresql":
+        return text(
+            "INSERT INTO message_search (message_id, user_id, chat_id, body, tsv) VALUES (:id, :user_id, :chat_id, :body,"
+            " to_tsvector('english', :body) || to_tsvector('arabic', :body)) ON CONFLICT (message_id) DO NOTHING"
+        )
+    return text("INSERT INTO message_fts (rowid, body, owner, chat_id) VALUES (:id, :body, :owner, :chat_id)")
+
+
+def _rows(user_id: int, rows) -> list[dict]:
+    return [
+        {"id": id_, "user_id": user_id, "owner": f"u{user_id}", "chat_id": chat_id, "body": normalize(content)}
+        for id_, chat_id, content in rows
+    ]
+
+
+async def index_rows(db: AsyncSession, user_id: int, rows: list[tuple[int, int, str]]):
+    # (message id, chat id, content), part of the caller's transaction
+    await db.execute(_insert_stmt(db.bind.dialect.name), _rows(user_id, rows))
+
+
+async def index_messages(db: AsyncSession, user_id: int, messages: list[Message]):
+    # flushed first so the messages have ids
+    await db.flush()
+    await index_rows(db, user_id, [(m.id, m.chat_id, m.content) for m in messages])
+
+
+def unindex_chat(dialect: str, chat_id: int):
+    # by message id: a chat_id filter would scan the whole fts table, the messages index finds the ids
+    return text(
+        f"DELETE FROM {'message_search WHERE message_id' if dialect == 'postgresql' else 'message_fts WHERE rowid'}"
+        " IN (SELECT id FROM messages WHERE chat_id = :chat_id)"
+    ).bindparams(chat_id=chat_id)
+
+
+_SQLITE_SEARCH = """
+SELECT f.rowid AS id, m.chat_id, c.title AS chat_title, m.role, m.lang, m.created_at,
+       m.content, highlight(message_fts, 0, :mark_start, :mark_end) AS marked,
+       bm25(message_fts, 1.0, 0.0) AS score
+FROM message_fts f
+JOIN messages m ON m.id = f.rowid
+JOIN chats c ON c.id = m.chat_id
+WHERE message_fts MATCH :q {filters}
+ORDER BY {order}
+LIMIT :limit
+"""
+
+_POSTGRES_SEARCH = """
+WITH query AS (SELECT websearch_to_tsquery(CAST(:config AS regconfig), :q) AS q),
+hits AS (
+    SELECT s.message_id, s.body, ts_rank_cd(s.tsv, query.q) AS score
+    FROM message_search s, query
+    WHERE s.user_id = :user_id AND s.tsv @@ query.q {filters}
+    ORDER BY {order}
+    LIMIT :limit
+)
+SELECT hits.message_id AS id, m.chat_id, c.title AS chat_title, m.role, m.lang, m.created_at,
+       m.content, ts_headline(CAST(:config AS regconfig), hits.body, query.q,
+                              'StartSel=' || :mark_start || ', StopSel=' || :mark_end || ', HighlightAll=true') AS marked,
+       hits.score
+FROM hits
+JOIN messages m ON m.id = hits.message_id
+JOIN chats c ON c.id = m.chat_id, query
+ORDER BY {outer_order}
+"""
+
+
+def _hits(content: str, marked: str) -> list[tuple[int, int]]:
+    # match spans in content, from the backend's highlighted copy of normalize(content)
+    plain, spans, start = [], [], None
+    for ch in marked:
+        if ch == _HIT_START:
+            start = len(plain)
+        elif ch == _HIT_END:
+            if start is not None and start < len(plain):
+                spans.append((start, len(plain)))
+            start = None
+        else:
+            plain.append(ch)
+    # normalize() drops characters or maps them one to one, so each kept character has one source position
+    kept = [i for i, ch in enumerate(content) if ch.translate(_ARABIC_FOLD)]
+    if "".join(plain) != normalize(content):
+        return []  # indexed from a different text, e.g. before a reindex
+    kept.append(len(content))
+    # a hit ends where the next kept character starts, so the harakat of its last letter stay inside
+    return [(kept[a], kept[b]) for a, b in spans]
+
+
+def snippet(content: str, marked: str, size: int = SNIPPET_CHARS) -> str:
+    """About size characters of content around the first hit, html-escaped, hits wrapped in <mark>."""
+    spans = _hits(content, marked)
+    lo = 0
+    if spans and spans[0][0] > size // 3:
+        lo = spans[0][0] - size // 3
+        space = content.rfind(" ", 0, lo)
+        lo = space + 1 if space > lo - 20 else lo
+    hi = min(len(content), lo + size)
+    if hi < len(content):
+        space = content.rfind(" ", lo, hi)
+        hi = space if space > hi - 20 else hi
+    out = ["…"] if lo else []
+    pos = lo
+    for a, b in spans:
+        a, b = max(a, pos), min(b, hi)
+        if a >= b:
+            continue
+        out += [html.escape(content[pos:a]), MARK_START, html.escape(content[a:b]), MARK_END]
+        pos = b
+    out.append(html.escape(content[pos:hi]))
+    if hi < len(content):
+        out.append("…")
+    return "".join(out)
+
+
+def _parse_cursor(cursor: str | None, order: str) -> tuple[float | None, int] | None:
+    # relevance cursors are "score:id", recent ones just the id
+    if not cursor:
+        return None
+    try:
+        if order == "recent":
+            return None, int(cursor)
+        score, _, last_id = cursor.partition(":")
+        score = float(score)
+        if not math.isfinite(score):
+            raise ValueError
+        return score, int(last_id)
+    except ValueError:
+        raise ValueError("invalid cursor")
+
+
+async def search(db: AsyncSession, user_id: int, q: str, lang: Lang, limit: int, cursor: str | None = None,
+                 order: str = "relevance", chat_id: int | None = None) -> tuple[list, str | None]:
+    """One page of hits plus the cursor of the next page. Raises ValueError on a malformed cursor."""
+    after = _parse_cursor(cursor, order)
+    dialect = db.bind.dialect.name
+    params = {"limit": limit + 1, "mark_start": _HIT_START, "mark_end": _HIT_END}
+    filters = []
+
+    if dialect == "postgresql":
+        score, row_id = "ts_rank_cd(s.tsv, query.q)", "s.message_id"
+        params.update(q=normalize(q), config=_pg_config(lang), user_id=user_id)
+        if chat_id is not None:
+            filters.append("s.chat_id = :chat_id")
+        if order == "recent":
+            order_by, outer = f"{row_id} DESC", "hits.message_id DESC"
+            if after:
+                filters.append(f"{row_id} < :after_id")
+        else:
+            # higher rank is better here
+            order_by, outer = f"score DESC, {row_id}", "hits.score DESC, hits.message_id"
+            if after:
+                filters.append(f"({score} < :after_score OR ({score} = :after_score AND {row_id} > :after_id))")
+        sql = _POSTGRES_SEARCH.format(filters="".join(f" AND {f}" for f in filters), order=order_by,
+                                      outer_order=outer)
+    else:
+        match = _fts_query(q, user_id)
+        if match is None:
+            return [], None
+        score, row_id = "bm25(message_fts, 1.0, 0.0)", "f.rowid"
+        params["q"] = match
+        if chat_id is not None:
+            filters.append("f.chat_id = :chat_id")
+        if order == "recent":
+            order_by = f"{row_id} DESC"
+            if after:
+                filters.append(f"{row_id} < :after_id")
+        else:
+            # bm25 is lower-is-better
+            order_by = f"{score}, {row_id}"
+            if after:
+                filters.append(f"({score} > :after_score OR ({score} = :after_score AND {row_id} > :after_id))")
+        sql = _SQLITE_SEARCH.format(filters="".join(f" AND {f}" for f in filters), order=order_by)
+
+    if chat_id is not None:
+        params["chat_id"] = chat_id
+    if after:
+        params["after_id"] = after[1]
+        if after[0] is not None:
+            params["after_score"] = after[0]
+
+    rows = (await db.execute(text(sql), params)).mappings().all()
+    more = len(rows) > limit
+    rows = [{**r, "snippet": snippet(r["content"], r["marked"])} for r in rows[:limit]]
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        next_cursor = str(last["id"]) if order == "recent" else f"{last['score']!r}:{last['id']}"
+    return rows, next_cursor
+
+
+def reindex(conn, batch_size: int = 5000) -> int:
+    """Rebuild the whole index from the messages table (sync connection)."""
+    from sqlalchemy import select
+
+    from app.db.models import Chat
+
+    dialect = conn.dialect.name
+    conn.execute(text(f"DELETE FROM {index_table(dialect)}"))
+    insert = _insert_stmt(dialect)
+    q = (
+        select(Message.id, Message.chat_id, Message.content, Chat.user_id)
+        .join(Chat, Chat.id == Message.chat_id)
+        .order_by(Message.id)
+        .execution_options(yield_per=batch_size)
+    )
+    total = 0
+    for part in conn.execute(q).partitions():
+        conn.execute(insert, [_rows(r.user_id, [(r.id, r.chat_id, r.content)])[0] for r in part])
+        total += len(part)
+    return total
+
+
+def main():
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(prog="python -m app.messages.search")
+    parser.add_argument("command", choices=["reindex"])
+    parser.parse_args()
+    with engine.begin() as conn:
+        ensure_index(conn)
+        print(f"indexed {reindex(conn)} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""The part of a chat turn every transport shares (/messages/send, the SSE stream, /ws):
+token accounting and storing the exchange once the LLM has answered."""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai.context import estimate_tokens
+from app.ai.summary_worker import enqueue_summary, summary_worker
+from app.core.config import get_settings
+from app.core.rate_limit import get_quota
+from app.db.models import Chat, Lang, Message, Role
+from app.db.stats import record_messages
+from app.messages.search import index_messages
+
+from .schemas import AssistantMessageResponse, UserMessageResponse
+
+settings = get_settings()
+
+
+class ChatDeleted(Exception):
+    pass
+
+
+def chat_title(content: str) -> str:
+    title = " ".join(content.split()[:6]) + ("..." if len(content.split()) > 6 else "")
+    return title or "New Chat"
+
+
+async def charge_tokens(user_id: int, messages: list[dict], reply: str):
+    if settings.RATE_LIMIT_ENABLED:
+        used = sum(estimate_tokens(m["content"]) for m in messages) + estimate_tokens(reply)
+        await get_quota().charge_tokens(user_id, used)
+
+
+def user_message_out(msg: Message) -> UserMessageResponse:
+    return UserMessageResponse(id=msg.id, role=msg.role.value, content=msg.content, lang=msg.lang.value)
+
+
+def assistant_message_out(msg: Message) -> AssistantMessageResponse:
+    return AssistantMessageResponse(
+        id=msg.id,
+        role=msg.role.value,
+        content=msg.content,
+        model=msg.model,
+        lang=msg.lang.value,
+    )
+
+
+async def save_turn(db: AsyncSession, user_id: int, chat: Chat | None, content: str, lang: Lang, model: str,
+                    reply: str) -> tuple[Chat, Message, Message]:
+    # one short transaction after the reply is in: both messages, the search index, the summary job and
+    # the counters. chat=None starts a new chat. raises ChatDeleted if the chat went away while the llm answered
+    new_chat = chat is None
+    if new_chat:
+        chat = Chat(user_id=user_id, title=chat_title(content))
+        db.add(chat)
+        await db.flush()
+    elif await db.scalar(select(Chat.id).where(Chat.id == chat.id, Chat.user_id == user_id)) is None:
+        # the chat may have been deleted while the llm answered. the owner is part of the check because the id
+        # came from the client, a write only ever goes to a chat of the user's own
+        raise ChatDeleted
+
+    user_msg = Message(chat_id=chat.id, role=Role.user, content=content, model=None, lang=lang)
+    assistant_msg = Message(chat_id=chat.id, role=Role.assistant, content=reply, model=model, lang=lang)
+    db.add_all([user_msg, assistant_msg])
+    await index_messages(db, user_id, [user_msg, assistant_msg])
+    enqueue_summary(db, chat.id, lang, model)
+    for stmt in record_messages(db.bind.dialect.name, user_id, messages=2, model=model,
+                                assistant_messages=1, new_chats=int(new_chat)):
+        await db.execute(stmt)
+    await db.commit()
+    summary_worker.notify(chat.id)
+    return chat, user_msg, assistant_msg
@@ -0,0 +1,229 @@
+"""One WebSocket per client for all of its chats.
+
+Connect to /ws?token=<jwt>, or connect and send {"type": "auth", "token": "<jwt>"} first
+(keeps the token out of access logs). Then, JSON text frames:
+
+    -> {"type": "send", "id": "a1", "chat_id": 3, "content": "...", "model": "gemini", "cache": true}
+    <- {"type": "token", "id": "a1", "chat_id": 3, "delta": "..."}      chat_id is null for a new chat
+    <- {"type": "done", "id": "a1", "chat_id": 3, "chat_title": ..., "user_message": ..., "assistant_message": ...}
+    -> {"type": "cancel", "id": "a1"}
+    <- {"type": "cancelled", "id": "a1", "chat_id": 3}
+    <- {"type": "error", "id": "a1", "status": 404, "detail": "..."}
+    -> {"type": "ping"}    <- {"type": "pong"}
+
+The id is picked by the client and tags every frame of one generation; up to WS_MAX_IN_FLIGHT
+of them run at once, on any of the user's chats. The token and the user are checked once per
+connection, chat ownership on every send as part of loading the chat: the chat ids come from the
+client, so each one is authorized against the user, not trusted because an earlier frame used it.
+A cancelled generation stores nothing, the tokens it already produced are still charged.
+"""
+import asyncio
+import json
+import logging
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app.ai.context import build_context
+from app.ai.limits import ProviderBusy
+from app.ai.router import provider_from_name
+from app.auth.principal import Principal, principal_cache
+from app.core.config import get_settings
+from app.core.lang_detect import detect_lang
+from app.core.rate_limit import QuotaExceeded, get_quota
+from app.db.models import Chat
+from app.db.session import AsyncSessionLocal
+from app.deps import principal_for_token
+
+from .schemas import SendFrame, SendMessageResponse
+from .turns import ChatDeleted, assistant_message_out, charge_tokens, save_turn, user_message_out
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["messages"])
+settings = get_settings()
+
+# application close codes, 4000 + the http status they stand for
+CLOSE_UNAUTHORIZED = 4401
+
+
+class ChatSocket:
+    def __init__(self, ws: WebSocket, token: str, principal: Principal):
+        self.ws = ws
+        self.token = token
+        self.principal = principal
+        self.generating: dict[str, asyncio.Task] = {}  # still cancellable
+        self.tasks: set[asyncio.Task] = set()  # everything running, saves included
+        self.closed = False
+
+    async def send(self, frame: dict):
+        if not self.closed:
+            try:
+                await self.ws.send_json(frame)
+            except (WebSocketDisconnect, RuntimeError):
+                self.closed = True
+
+    async def error(self, ref: str | None, status: int, detail: str, **extra):
+        await self.send({"type": "error", "id": ref, "status": status, "detail": detail, **extra})
+
+    async def run(self):
+        try:
+            while True:
+                raw = await self.ws.receive_text()
+                try:
+                    frame = json.loads(raw)
+                except ValueError:
+                    await self.error(None, 400, "invalid json")
+                    continue
+                kind = frame.get("type") if isinstance(frame, dict) else None
+                if kind == "send":
+                    if not await self.start(frame):
+                        return
+                elif kind == "cancel":
+                    task = self.generating.get(frame.get("id"))
+                    if task is None:
+                        await self.error(frame.get("id"), 404, "no generation with this id")
+                    else:
+                        task.cancel()
+                elif kind == "ping":
+                    await self.send({"type": "pong"})
+                else:
+                    await self.error(frame.get("id") if isinstance(frame, dict) else None, 400,
+                                     "type must be 'send', 'cancel' or 'ping'")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.closed = True
+            for task in self.generating.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def start(self, raw: dict) -> bool:
+        """Validates a send frame and starts its generation. False when the connection has to close."""
+        ref = raw.get("id") if isinstance(raw.get("id"), str) else None
+        try:
+            frame = SendFrame.model_validate(raw)
+        except ValidationError as e:
+            await self.error(ref, 422, f"invalid send: {e.errors()[0]['msg']}")
+            return True
+
+        # the cache entry goes away with the token's exp or when the user changes, then the token is checked again
+        if principal_cache.get(self.token) is None:
+            try:
+                async with AsyncSessionLocal() as db:
+                    self.principal = await principal_for_token(self.token, db)
+            except HTTPException as e:
+                await self.error(frame.id, 401, e.detail)
+                await self.ws.close(CLOSE_UNAUTHORIZED, e.detail)
+                return False
+
+        content = frame.content.strip()
+        prov, problem = None, None
+        if frame.id in self.generating:
+            problem = 409, "id already in use"
+        elif len(self.generating) >= settings.WS_MAX_IN_FLIGHT:
+            problem = 429, f"at most {settings.WS_MAX_IN_FLIGHT} generations at once"
+        elif not content:
+            problem = 400, "content is required"
+        else:
+            prov = provider_from_name(frame.model, cache=frame.cache)
+            if not prov:
+                problem = 503, "AI provider/model not available"
+        if problem:
+            await self.error(frame.id, *problem)
+            return True
+        if settings.RATE_LIMIT_ENABLED:
+            try:
+                await get_quota().check(self.principal.id)
+            except QuotaExceeded as e:
+                await self.error(frame.id, 429, f"{e.decision.bucket.name.capitalize()} quota used up",
+                                 retry_after=e.retry_after)
+                return True
+
+        task = asyncio.create_task(self.generate(frame, content, prov))
+        self.generating[frame.id] = task
+        self.tasks.add(task)
+
+        def done(t: asyncio.Task):
+            self.tasks.discard(t)
+            if self.generating.get(frame.id) is t:
+                del self.generating[frame.id]
+
+        task.add_done_callback(done)
+        return True
+
+    async def generate(self, frame: SendFrame, content: str, prov):
+        ref, chat_id, user_id = frame.id, frame.chat_id, self.principal.id
+        lang = detect_lang(content, fallback=self.principal.preferred_lang)
+        parts: list[str] = []
+        messages = None
+        try:
+            async with AsyncSessionLocal() as db:
+                chat = None
+                if chat_id is not None:
+                    chat = await db.scalar(
+                        select(Chat).options(joinedload(Chat.summary))
+                        .where(Chat.id == chat_id, Chat.user_id == user_id)
+                    )
+                    if chat is None:
+                        return await self.error(ref, 404, "Chat not found")
+                messages = await build_context(db, chat, content, lang, prov.name)
+                summary_text = chat.summary.summary if chat and chat.summary else None
+                # no transaction stays open while the llm answers
+                await db.commit()
+
+                try:
+                    async for delta in prov.chat_stream(messages, lang=lang.value):
+                        parts.append(delta)
+                        await self.send({"type": "token", "id": ref, "chat_id": chat_id, "delta": delta})
+                except ProviderBusy:
+                    return await self.error(ref, 503, "AI provider is busy, please retry shortly.")
+                except Exception:
+                    logger.exception("ws generation failed")
+                    return await self.error(ref, 502, "AI provider failed")
+
+                # the reply is complete, a late cancel doesn't undo it any more
+                self.generating.pop(ref, None)
+                reply = "".join(parts)
+                await charge_tokens(user_id, messages, reply)
+                try:
+                    chat, user_msg, assistant_msg = await save_turn(db, user_id, chat, content, lang, prov.name, reply)
+                except ChatDeleted:
+                    return await self.error(ref, 404, "Chat not found")
+        except asyncio.CancelledError:
+            if messages is not None:
+                await charge_tokens(user_id, messages, "".join(parts))
+            await self.send({"type": "cancelled", "id": ref, "chat_id": chat_id})
+            return
+
+        await self.send({"type": "done", "id": ref, **SendMessageResponse(
+            chat_id=chat.id,
+            chat_title=chat.title,
+            user_message=user_message_out(user_msg),
+            assistant_message=assistant_message_out(assistant_msg),
+            chat_summary=summary_text,
+        ).model_dump()})
+
+
+@router.websocket("/ws")
+async def chat_socket(ws: WebSocket, token: str | None = None):
+    await ws.accept()
+    try:
+        if token is None:
+            frame = json.loads(await asyncio.wait_for(ws.receive_text(), settings.WS_AUTH_TIMEOUT_SECONDS))
+            if isinstance(frame, dict) and frame.get("type") == "auth" and isinstance(frame.get("token"), str):
+                token = frame["token"]
+        if not token:
+            return await ws.close(CLOSE_UNAUTHORIZED, "send an auth frame first")
+        async with AsyncSessionLocal() as db:
+            principal = await principal_for_token(token, db)
+    except HTTPException as e:
+        return await ws.close(CLOSE_UNAUTHORIZED, e.detail)
+    except (asyncio.TimeoutError, ValueError):
+        return await ws.close(CLOSE_UNAUTHORIZED, "send an auth frame first")
+    except WebSocketDisconnect:
+        return
+
+    await ws.send_json({"type": "ready", "user_id": principal.id})
+    await ChatSocket(ws, token, principal).run()
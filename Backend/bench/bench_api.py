@@ -0,0 +1,96 @@
+"""End-to-end load test through the ASGI app (no network, fake LLM provider, throwaway SQLite db).
+
+Each virtual user logs in, then loops: send a message (new chat, then follow-ups),
+list chats, open the chat. Latency per route plus overall req/s are printed.
+
+    cd Backend && python -m bench.bench_api --users 20 --duration 20 --llm-latency-ms 200 [--json baseline.json]
+
+Login is dominated by Argon2 on the process pool, lower ARGON2_MEMORY_COST to take it out of the picture.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+from bench.common import print_table, summarize, use_fake_backend, write_json
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_api")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load after login")
+    parser.add_argument("--follow-ups", type=int, default=4, help="messages per chat before starting a new one")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0)
+    parser.add_argument("--llm-failure-rate", type=float, default=0)
+    parser.add_argument("--stream", action="store_true", help="use /messages/send/stream")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    return parser.parse_args()
+
+
+async def run(args):
+    import httpx
+
+    from app.main import app
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    send_route = "/messages/send/stream" if args.stream else "/messages/send"
+
+    async def call(client, name: str, method: str, url: str, **kw):
+        start = time.perf_counter()
+        r = await client.request(method, url, **kw)
+        latencies[name].append(time.perf_counter() - start)
+        if r.status_code >= 400 or (args.stream and name == send_route and "event: error" in r.text):
+            errors[name] += 1
+            return None
+        return r
+
+    async def user(client, i: int, deadline: float):
+        creds = {"email": f"bench{i}@example.com", "password": "bench-password"}
+        await client.post("/auth/signup", json=creds)
+        r = await call(client, "/auth/login", "POST", "/auth/login", json=creds)
+        if r is None:
+            return
+        h = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        chat_id, n = None, 0
+        while time.perf_counter() < deadline:
+            r = await call(client, send_route, "POST", send_route, headers=h,
+                           json={"chat_id": chat_id, "content": f"user {i} question {n} about stars", "model": "fake"})
+            if r is not None and chat_id is None and not args.stream:
+                chat_id = r.json()["chat_id"]
+            n += 1
+            if n % args.follow_ups == 0:
+                chat_id = None
+            await call(client, "/chats", "GET", "/chats", headers=h)
+            if chat_id:
+                await call(client, "/chats/{chat_id}", "GET", f"/chats/{chat_id}", headers=h)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*(user(client, i, deadline) for i in range(args.users)))
+            elapsed = time.perf_counter() - start
+
+    rows = {name: summarize(samples, elapsed, errors[name]) for name, samples in latencies.items()}
+    rows["total"] = summarize([x for s in latencies.values() for x in s], elapsed, sum(errors.values()))
+    print_table(rows)
+    write_json(args.json, rows, **vars(args))
+
+
+def main():
+    args = parse_args()
+    use_fake_backend(
+        FAKE_LATENCY_MS=args.llm_latency_ms,
+        FAKE_TOKENS_PER_SECOND=args.llm_tokens_per_second,
+        FAKE_FAILURE_RATE=args.llm_failure_rate,
+        # every message differs anyway, but keep the cache from hiding provider time
+        COMPLETION_CACHE_ENABLED="false",
+    )
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Mixed read/write load on the database, SQLite journal settings before and after.
+
+Readers list a user's chats and page through one of them. Writers do what a chat turn does:
+one transaction with both messages, the search index, the summary job and the counters, then
+a second one storing the chat summary. Every profile gets a fresh file and --processes worker
+processes hitting it at once, like uvicorn workers would.
+
+    cd Backend && python -m bench.bench_db --processes 4 --readers 4 --writers 2 --seconds 10
+    DATABASE_URL=postgresql://... python -m bench.bench_db --profiles tuned
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from bench.common import print_table, summarize, use_fake_backend, write_json
+
+PROFILES = {
+    # sqlite's own defaults: rollback journal, fsync on every commit
+    "baseline": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0"},
+    # whatever app/core/config.py defaults to
+    "tuned": {},
+}
+
+
+async def worker(args):
+    from sqlalchemy import delete, select
+    from sqlalchemy.exc import OperationalError
+
+    from app.ai.summary_worker import enqueue_summary
+    from app.db.migrate import migrate
+    from app.db.models import Chat, ChatSummary, Lang, Message, Role, SummaryJob
+    from app.db.session import AsyncSessionLocal, async_engine, engine
+    from app.db.stats import record_messages
+    from app.messages.search import index_messages
+    from bench.bench_search import seed
+
+    if args.worker == "seed":
+        migrate(engine)
+        seed(engine, args.messages, args.users)
+        return
+    chats = args.messages // 50
+    samples = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+
+    async def read(rng):
+        user_id = rng.randint(1, args.users)
+        async with AsyncSessionLocal() as db:
+            ids = (await db.scalars(
+                select(Chat.id).where(Chat.user_id == user_id).order_by(Chat.created_at.desc()).limit(20)
+            )).all()
+            if ids:
+                (await db.scalars(
+                    select(Message).where(Message.chat_id == rng.choice(ids)).order_by(Message.id.desc()).limit(50)
+                )).all()
+
+    async def write(rng):
+        chat_id = rng.randint(1, chats)
+        async with AsyncSessionLocal() as db:
+            user_id = await db.scalar(select(Chat.user_id).where(Chat.id == chat_id))
+            words = " ".join(rng.choices(("star", "light", "query", "index", "river", "signal"), k=30))
+            user_msg = Message(chat_id=chat_id, role=Role.user, content=words, lang=Lang.en)
+            reply = Message(chat_id=chat_id, role=Role.assistant, content=words, model="fake", lang=Lang.en)
+            db.add_all([user_msg, reply])
+            await index_messages(db, user_id, [user_msg, reply])
+            enqueue_summary(db, chat_id, Lang.en, "fake")
+            for stmt in record_messages(engine.dialect.name, user_id, messages=2, model="fake", assistant_messages=1):
+                await db.execute(stmt)
+            await db.commit()
+
+            summary = await db.scalar(select(ChatSummary).where(ChatSummary.chat_id == chat_id))
+            if summary is None:
+                db.add(ChatSummary(chat_id=chat_id, lang=Lang.en, summary=words))
+            else:
+                summary.summary = words
+            await db.execute(delete(SummaryJob).where(SummaryJob.chat_id == chat_id))
+            await db.commit()
+
+    async def loop(kind, op, seed_):
+        rng = random.Random(seed_)
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                await op(rng)
+            except OperationalError:  # "database is locked" once busy_timeout runs out
+                errors[kind] += 1
+                continue
+            samples[kind].append(time.perf_counter() - t0)
+            if args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+    await asyncio.sleep(max(0.0, args.start - time.time()))
+    deadline = time.perf_counter() + args.seconds
+    await asyncio.gather(
+        *(loop("read", read, i) for i in range(args.readers)),
+        *(loop("write", write, 1000 + i) for i in range(args.writers)),
+    )
+    await async_engine.dispose()
+    print(json.dumps({"samples": samples, "errors": errors}))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_db")
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4, help="per process")
+    parser.add_argument("--writers", type=int, default=2, help="per process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--think-ms", type=float, default=20, help="mean pause between a task's operations")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--json", default=None)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--start", type=float, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(worker(args))
+        return
+
+    url = os.environ.get("DATABASE_URL")
+    rows = {}
+    for profile in args.profiles.split(","):
+        for key in {k for p in PROFILES.values() for k in p}:
+            os.environ.pop(key, None)
+        # a fresh sqlite file per profile unless DATABASE_URL points somewhere
+        use_fake_backend(**PROFILES[profile], **({"DATABASE_URL": url} if url else {}))
+        cmd = [sys.executable, "-m", "bench.bench_db", "--readers", str(args.readers), "--writers", str(args.writers),
+               "--seconds", str(args.seconds), "--messages", str(args.messages), "--users", str(args.users),
+               "--think-ms", str(args.think_ms)]
+        subprocess.run(cmd + ["--worker", "seed"], check=True)
+        # all processes start the clock together, after their imports
+        start = str(time.time() + 3)
+        procs = [subprocess.Popen(cmd + ["--worker", "run", "--start", start], stdout=subprocess.PIPE, text=True)
+                 for _ in range(args.processes)]
+        samples, errors = {"read": [], "write": []}, {"read": 0, "write": 0}
+        for proc in procs:
+            out, _ = proc.communicate()
+            if proc.returncode:
+                raise SystemExit(f"worker exited with {proc.returncode}")
+            result = json.loads(out.strip().splitlines()[-1])
+            for kind in samples:
+                samples[kind] += result["samples"][kind]
+                errors[kind] += result["errors"][kind]
+        for kind in samples:
+            rows[f"{profile} {kind}"] = summarize(samples[kind], args.seconds, errors[kind])
+    print(f"{args.processes} processes x ({args.readers} readers + {args.writers} writers), {args.seconds:g}s per profile")
+    print_table(rows)
+    write_json(args.json, rows, **{k: v for k, v in vars(args).items() if k not in ("worker", "start")})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cold import time of app.main, measured with `python -X importtime` in fresh interpreters.
+
+Exits non-zero when the import takes longer than --budget-ms or pulls in a module that
+should only load on first use (vendor SDKs, langdetect), so CI can run it as a check:
+
+    cd Backend && python -m bench.bench_import --runs 5 --budget-ms 1000
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# loaded lazily by LazyProvider / lang_detect, importing app.main must not bring them in
+LAZY_MODULES = ("google.generativeai", "grpc", "groq", "mistralai", "langdetect")
+
+_PROBE = (
+    "import sys, app.main; "
+    f"print('EAGER', *[m for m in {LAZY_MODULES!r} if m in sys.modules])"
+)
+
+
+def one_run() -> tuple[float, dict[str, float], list[str]]:
+    env = {**os.environ, "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite:///:memory:")}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE],
+                          capture_output=True, text=True, env=env, check=True)
+    total_us, per_package = 0.0, defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        per_package[name.split(".")[0]] += int(self_us)
+        if name == "app.main":
+            total_us = int(cumulative_us)
+    eager = proc.stdout.split("EAGER", 1)[1].split()
+    return total_us / 1000, {k: v / 1000 for k, v in per_package.items()}, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when the best run is slower")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [one_run() for _ in range(args.runs)]
+    totals = sorted(r[0] for r in runs)
+    best = min(runs, key=lambda r: r[0])
+    print(f"import app.main: best {totals[0]:.0f} ms, median {totals[len(totals) // 2]:.0f} ms over {args.runs} runs")
+    print("self time by top-level package (best run):")
+    for name, ms in sorted(best[1].items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"  {name:<24} {ms:>7.1f} ms")
+
+    failed = False
+    if best[2]:
+        print(f"FAIL: imported eagerly: {', '.join(best[2])}")
+        failed = True
+    if args.budget_ms is not None and totals[0] > args.budget_ms:
+        print(f"FAIL: {totals[0]:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Per-message cost of language detection: langdetect (old hot path) vs the script-ratio detector.
+
+    cd Backend && python -m bench.bench_lang_detect
+"""
+import timeit
+
+from langdetect import DetectorFactory, detect
+
+from app.core.lang_detect import detect_lang
+from app.db.models import Lang
+
+SAMPLES = {
+    "short en": "hi",
+    "en": "Hello! Tell me something about space, black holes and how stars are born.",
+    "ar": "مرحبا! أخبرني شيئاً عن الفضاء والثقوب السوداء وكيف تولد النجوم.",
+    "mixed": "Explain Python decorators بالعربية please",
+    "long en": "The quick brown fox jumps over the lazy dog. " * 100,
+}
+
+
+def per_call_us(fn, number: int) -> float:
+    return timeit.timeit(fn, number=number) / number * 1e6
+
+
+def main():
+    DetectorFactory.seed = 0
+    detect("warm up the profiles")  # the first call loads every language profile, don't count that
+
+    print(f"{'sample':<10} {'langdetect':>14} {'script':>10} {'speedup':>9}   result")
+    for name, text in SAMPLES.items():
+        old = per_call_us(lambda: detect(text), 50)
+        new = per_call_us(lambda: detect_lang(text, fallback=Lang.en, mode="script"), 20000)
+        print(f"{name:<10} {old:>11.1f} us {new:>7.2f} us {old / new:>8.0f}x   "
+              f"{detect(text)} -> {detect_lang(text, fallback=Lang.en, mode='script').value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmarks for the per-request helpers.
+
+    cd Backend && python -m bench.bench_micro [--history 200] [--json micro.json]
+"""
+import argparse
+import asyncio
+import time
+
+from bench.common import print_table, summarize, use_fake_backend, write_json
+
+
+def timed(fn, number: int) -> list[float]:
+    out = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+async def atimed(fn, number: int) -> list[float]:
+    out = []
+    for _ in range(number):
+        start = time.perf_counter()
+        await fn()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+async def run(args):
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+
+    from app.ai.context import build_context, estimate_tokens
+    from app.auth.principal import Principal, principal_cache
+    from app.core.lang_detect import detect_lang
+    from app.core.security import create_access_token, decode_token
+    from app.db.base import Base
+    from app.db.models import Chat, Lang, Message, Role, User
+    from app.db.session import AsyncSessionLocal, async_engine, engine
+
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        user = User(email="micro@example.com", hashed_password="x", preferred_lang=Lang.en)
+        db.add(user)
+        await db.flush()
+        chat = Chat(user_id=user.id, title="micro")
+        db.add(chat)
+        await db.flush()
+        db.add_all(
+            Message(chat_id=chat.id, role=Role.user if i % 2 == 0 else Role.assistant,
+                    content=f"message {i} " + "lorem ipsum dolor sit amet " * 20, lang=Lang.en)
+            for i in range(args.history)
+        )
+        await db.commit()
+        chat_id, user_id = chat.id, user.id
+
+    token = create_access_token("micro@example.com", uid=user_id)
+    principal_cache.put(token, Principal(user_id, "micro@example.com", Lang.en), None)
+    en = "Hello! Tell me something about space, black holes and how stars are born."
+    ar = "مرحبا! أخبرني شيئاً عن الفضاء والثقوب السوداء وكيف تولد النجوم."
+    long_text = "The quick brown fox jumps over the lazy dog. " * 200
+
+    n = args.number
+    rows = {}
+    for name, fn in {
+        "jwt decode": lambda: decode_token(token),
+        "principal cache hit": lambda: principal_cache.get(token),
+        "detect_lang en": lambda: detect_lang(en, Lang.en),
+        "detect_lang ar": lambda: detect_lang(ar, Lang.en),
+        "estimate_tokens 9KB": lambda: estimate_tokens(long_text),
+    }.items():
+        samples = timed(fn, n)
+        rows[name] = summarize(samples, sum(samples))
+
+    async with AsyncSessionLocal() as db:
+        async def assemble():
+            chat = await db.scalar(select(Chat).options(selectinload(Chat.summary)).where(Chat.id == chat_id))
+            await build_context(db, chat, en, Lang.en, "fake")
+            db.expunge_all()
+
+        samples = await atimed(assemble, max(1, n // 20))
+        rows[f"build_context ({args.history} msgs)"] = summarize(samples, sum(samples))
+
+    await async_engine.dispose()
+    print_table(rows, unit="us")
+    write_json(args.json, rows, **vars(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_micro")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=200, help="messages in the chat build_context reads")
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+    use_fake_backend()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Upgrades databases in older schemas with app.db.migrate and checks the result.
+
+Exits non-zero when a migration fails or leaves the data wrong, so CI can run it as a check:
+
+    cd Backend && python -m bench.bench_migrate
+"""
+import sys
+import tempfile
+import time
+
+from bench.common import use_fake_backend
+
+# the tables as the first release created them: no AUTOINCREMENT, no index on chat_summaries.chat_id
+BASELINE = [
+    "CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, email VARCHAR(255) NOT NULL, "
+    "hashed_password VARCHAR NOT NULL, preferred_lang VARCHAR(2) NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE TABLE chats (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), "
+    "title VARCHAR(255) NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE TABLE messages (id INTEGER NOT NULL PRIMARY KEY, chat_id INTEGER NOT NULL REFERENCES chats (id), "
+    "role VARCHAR(9) NOT NULL, content TEXT NOT NULL, model VARCHAR(64), lang VARCHAR(2) NOT NULL, "
+    "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE TABLE user_summaries (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), "
+    "lang VARCHAR(2) NOT NULL, summary TEXT NOT NULL, updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+    "CREATE TABLE chat_summaries (id INTEGER NOT NULL PRIMARY KEY, chat_id INTEGER NOT NULL REFERENCES chats (id), "
+    "lang VARCHAR(2) NOT NULL, summary TEXT NOT NULL, updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP))",
+]
+ROWS = [
+    "INSERT INTO users (id, email, hashed_password, preferred_lang) VALUES (1, 'a@example.com', 'x', 'en')",
+    "INSERT INTO chats (id, user_id, title) VALUES (1, 1, 'one'), (2, 1, 'two')",
+    "INSERT INTO messages (id, chat_id, role, content, lang) VALUES (1, 1, 'user', 'hello there', 'en'), "
+    "(2, 1, 'assistant', 'hi', 'en'), (3, 2, 'user', 'second chat', 'en')",
+    # two summaries for chat 1, the newer one has to survive the unique index
+    "INSERT INTO chat_summaries (id, chat_id, lang, summary) VALUES (1, 1, 'en', 'old'), (2, 1, 'en', 'new'), "
+    "(3, 2, 'en', 'only')",
+]
+
+# (name, extra statements on top of the baseline)
+CASES = [
+    ("baseline, no index on chat_summaries.chat_id", []),
+    ("plain index on chat_summaries.chat_id", ["CREATE INDEX ix_chat_summaries_chat_id ON chat_summaries (chat_id)"]),
+]
+
+
+def check(engine) -> list[str]:
+    from sqlalchemy import inspect, text
+
+    problems = []
+    with engine.connect() as conn:
+        summaries = conn.execute(text("SELECT chat_id, summary FROM chat_summaries ORDER BY chat_id")).all()
+        if [tuple(r) for r in summaries] != [(1, "new"), (2, "only")]:
+            problems.append(f"chat_summaries after dedup: {summaries}")
+        for table in ("chats", "messages"):
+            sql = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :n"), {"n": table})
+            if "AUTOINCREMENT" not in sql.upper():
+                problems.append(f"{table} is not AUTOINCREMENT")
+        if conn.scalar(text("SELECT count(*) FROM messages")) != 3:
+            problems.append("messages lost in the table rebuild")
+        stats = conn.execute(text("SELECT total_chats, total_messages FROM user_stats WHERE user_id = 1")).one_or_none()
+        if tuple(stats or ()) != (2, 3):
+            problems.append(f"user_stats: {stats}")
+    if not any(i["unique"] and i["column_names"] == ["chat_id"] for i in inspect(engine).get_indexes("chat_summaries")):
+        problems.append("chat_summaries.chat_id has no unique index")
+    return problems
+
+
+def main():
+    use_fake_backend()
+    from sqlalchemy import create_engine, text
+
+    from app.db.migrate import migrate
+
+    failed = False
+    for name, extra in CASES:
+        engine = create_engine(f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/migrate.db")
+        with engine.begin() as conn:
+            for stmt in BASELINE + extra + ROWS:
+                conn.execute(text(stmt))
+        start = time.perf_counter()
+        try:
+            migrate(engine)
+            problems = check(engine)
+        except Exception as exc:
+            problems = [f"{type(exc).__name__}: {exc}"]
+        engine.dispose()
+        print(f"{'ok' if not problems else 'FAIL':<5} {name} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        for problem in problems:
+            print(f"      {problem}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
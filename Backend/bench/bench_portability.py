@@ -0,0 +1,70 @@
+"""Export then re-import a heavy user's history.
+
+Calls the export generator and the import function directly: httpx's ASGI transport buffers
+whole bodies, which would hide the constant-memory behaviour this is meant to show.
+
+    cd Backend && python -m bench.bench_portability --messages 200000
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from bench.common import use_fake_backend
+
+
+async def run(args):
+    from app.chats.portability import export_chats, import_chats
+    from app.db.base import Base
+    from app.db.models import Lang, User
+    from app.db.session import AsyncSessionLocal, async_engine, engine
+    from app.messages.search import ensure_index
+    from bench.bench_search import seed
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        ensure_index(conn)
+    seed(engine, args.messages, users=1)
+    path = os.path.join(args.tmp, "export.ndjson")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = lines = 0
+    with open(path, "wb") as f:
+        async for chunk in export_chats(1):
+            f.write(chunk)
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    print(f"export  {lines} lines, {size / 1e6:.1f} MB in {elapsed:.2f}s, peak python memory {peak / 1e6:.1f} MB")
+
+    async def body():
+        with open(path, "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+
+    async with AsyncSessionLocal() as db:
+        importer = User(email="importer@example.com", hashed_password="x", preferred_lang=Lang.en)
+        db.add(importer)
+        await db.flush()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        counts = await import_chats(db, importer.id, body())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    await async_engine.dispose()
+    print(f"import  {counts} in {elapsed:.2f}s, peak python memory {peak / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_portability")
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+    args.tmp = use_fake_backend()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
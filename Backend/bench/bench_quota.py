@@ -0,0 +1,44 @@
+"""Per-request cost of the quota check for each storage backend.
+
+    cd Backend && python -m bench.bench_quota [--redis redis://localhost:6379/0]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.core.rate_limit import Bucket, MemoryStore, RedisStore, SQLiteStore, UserQuota
+
+
+async def per_call_us(quota: UserQuota, number: int) -> float:
+    start = time.perf_counter()
+    for i in range(number):
+        await quota.check(i % 1000)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_quota")
+    parser.add_argument("--redis", default=None, help="also measure a redis-protocol server at this url")
+    parser.add_argument("-n", type=int, default=5000)
+    args = parser.parse_args()
+
+    # big buckets so every check is allowed and we measure the happy path
+    requests, tokens = Bucket("requests", 10**9, 60), Bucket("tokens", 10**9, 3600)
+    stores = {
+        "memory": MemoryStore(100000, 3600),
+        "sqlite": SQLiteStore(os.path.join(tempfile.mkdtemp(), "rl.db")),
+    }
+    if args.redis:
+        stores["redis"] = RedisStore(args.redis)
+
+    for name, store in stores.items():
+        quota = UserQuota(store, requests, tokens)
+        await per_call_us(quota, 100)  # warm up
+        print(f"{name:<8} {await per_call_us(quota, args.n):>8.1f} us per check")
+        await quota.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
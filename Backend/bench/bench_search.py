@@ -0,0 +1,105 @@
+"""Search latency on a large synthetic index (SQLite FTS5 unless DATABASE_URL says otherwise).
+
+    cd Backend && python -m bench.bench_search --messages 1000000 --users 1000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bench.common import print_table, summarize, use_fake_backend
+
+WORDS = ("space star galaxy planet orbit light black hole energy python code function class error "
+         "database index query table recipe chicken rice travel paris train ticket music guitar song "
+         "running runner runs dog dogs cat weather rain").split()
+ARABIC = "الفضاء نجم مجرة كوكب مدرسة الطالب كتاب درس طعام سفر قطار موسيقى".split()
+
+
+def vocabulary(rng: random.Random, size: int = 20000) -> tuple[list[str], list[float]]:
+    # zipf-ish word frequencies like real text, the words the queries use spread over the first ~2000 ranks
+    words = [f"term{i}" for i in range(size)]
+    for w, rank in zip(WORDS, rng.sample(range(2000), len(WORDS))):
+        words[rank] = w
+    return words, [1 / (rank + 10) for rank in range(size)]
+
+
+def seed(engine, messages: int, users: int, per_chat: int = 50):
+    from sqlalchemy import insert
+
+    from app.db.models import Chat, Lang, Message, Role, User
+
+    rng = random.Random(0)
+    vocab, weights = vocabulary(rng)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": u, "email": f"s{u}@example.com", "hashed_password": "x", "preferred_lang": Lang.en}
+            for u in range(1, users + 1)
+        ])
+        chats = messages // per_chat
+        conn.execute(insert(Chat), [{"id": c, "user_id": c % users + 1, "title": f"chat {c}"} for c in range(1, chats + 1)])
+        batch = []
+        for i in range(1, messages + 1):
+            ar = i % 5 == 0
+            words = rng.choices(ARABIC, k=rng.randint(8, 40)) if ar else rng.choices(vocab, weights, k=rng.randint(8, 40))
+            batch.append({"chat_id": (i - 1) // per_chat + 1, "role": Role.user if i % 2 else Role.assistant,
+                          "content": " ".join(words), "lang": Lang.ar if ar else Lang.en})
+            if len(batch) == 20000:
+                conn.execute(insert(Message), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Message), batch)
+
+
+async def run(args):
+    from app.db.models import Lang
+    from app.db.session import AsyncSessionLocal, async_engine, engine
+    from app.messages.search import reindex, search
+
+    from app.db.base import Base
+    from app.messages.search import ensure_index
+
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    seed(engine, args.messages, args.users)
+    with engine.begin() as conn:
+        ensure_index(conn)
+        n = reindex(conn)
+    print(f"seeded and indexed {n} messages in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(1)
+    queries = {
+        "one word": lambda: rng.choice(WORDS),
+        "two words": lambda: f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+        "stemmed (run)": lambda: "run",
+        "arabic": lambda: rng.choice(ARABIC),
+        "prefix (gal)": lambda: "gal",
+    }
+    rows = {}
+    async with AsyncSessionLocal() as db:
+        for name, make in queries.items():
+            for order in ("relevance", "recent"):
+                samples = []
+                for _ in range(args.number):
+                    user_id = rng.randint(1, args.users)
+                    t0 = time.perf_counter()
+                    hits, cursor = await search(db, user_id, make(), Lang.en, 20, order=order)
+                    if cursor:  # second page too, that's where keyset pagination matters
+                        await search(db, user_id, make(), Lang.en, 20, cursor=cursor, order=order)
+                    samples.append(time.perf_counter() - t0)
+                rows[f"{name} / {order}"] = summarize(samples, sum(samples))
+    await async_engine.dispose()
+    print_table(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_search")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--number", type=int, default=50, help="queries per row (each fetches two pages)")
+    args = parser.parse_args()
+    use_fake_backend()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Summarizer calls and what the context still knows: the old rewrite after every exchange vs the
+threshold policy in app/ai/summary_policy.py.
+
+Every user message states a fact ("F0042"), replies are filler. After each turn the summary step
+runs (an idle worker does that), and every --check-every turns the context for a new message is
+built and scored by the share of all facts so far that it still contains.
+
+The default summarizer is an extractive stand-in: it returns the facts found in its prompt, at most
+--summary-facts of them, and drops a random (seeded) few when there are more. That makes quality
+a matter of how often facts get squeezed through a summary, the way repeated rewrites drift. Pass
+--provider gemini (with its API key set) to use a real model instead.
+
+    cd Backend && python -m bench.bench_summary --turns 200
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import re
+import statistics
+
+from bench.common import use_fake_backend
+
+FACT = re.compile(r"\bF\d{4}\b")
+FILLER = ("the", "a", "star", "light", "model", "answer", "space", "time", "data", "chat",
+          "quick", "fox", "query", "token", "cloud", "river", "stone", "signal", "energy", "path")
+
+
+class Extractive:
+    name = "extractive"
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    async def chat(self, messages: list[dict], lang: str) -> str:
+        from app.ai.context import estimate_tokens
+
+        self.calls += 1
+        self.prompt_tokens += sum(estimate_tokens(m["content"]) for m in messages)
+        text = "\n".join(m["content"] for m in messages)
+        facts = list(dict.fromkeys(FACT.findall(text)))
+        if len(facts) > self.cap:
+            rng = random.Random(hashlib.sha256(text.encode()).digest())
+            keep = set(rng.sample(facts, self.cap))
+            facts = [f for f in facts if f in keep]
+        return "The user mentioned " + ", ".join(facts) + "." if facts else "Small talk so far."
+
+
+async def every_turn(db, chat, prov, lang, user_msg: str, reply: str):
+    # the summary update as it was before the policy: the whole summary rewritten after each exchange,
+    # without covered_message_id, so build_context sends it plus the latest messages
+    from app.db.models import ChatSummary
+
+    old_summary = chat.summary.summary if chat.summary else ""
+    turns = f"The user said:\n{user_msg}\n\nAnd the assistant replied:\n{reply}"
+    user_prompt = (
+        f"Here is the current summary:\n\n{old_summary}\n\n"
+        f"Since then:\n\n{turns}\n\n"
+        "Please update the summary so it remains short, meaningful, and reflects the new exchanges."
+    )
+    convo = [{"role": "system", "content": "You are an assistant that updates a chat summary."},
+             {"role": "user", "content": user_prompt}]
+    text = await prov.chat(convo, lang.value)
+    if chat.summary:
+        chat.summary.summary = text
+    else:
+        db.add(ChatSummary(chat_id=chat.id, lang=lang, summary=text))
+
+
+async def run(args, strategy: str, prov) -> dict:
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+
+    from app.ai.context import build_context, estimate_tokens
+    from app.ai.summary_policy import summarize_chat
+    from app.db.models import Chat, Lang, Message, Role, User
+    from app.db.session import AsyncSessionLocal
+
+    rng = random.Random(args.seed)
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"{strategy}@bench", hashed_password="x", preferred_lang=Lang.en)
+        db.add(user)
+        await db.flush()
+        chat = Chat(user_id=user.id, title=strategy)
+        db.add(chat)
+        await db.commit()
+        chat_id = chat.id
+
+    calls_before, prompt_before = getattr(prov, "calls", 0), getattr(prov, "prompt_tokens", 0)
+    recalls, context_tokens, calls = [], [], 0
+    for turn in range(args.turns):
+        content = f"Please remember F{turn:04d}. " + " ".join(rng.choices(FILLER, k=args.user_words))
+        reply = " ".join(rng.choices(FILLER, k=args.reply_words))
+        async with AsyncSessionLocal() as db:
+            db.add_all([Message(chat_id=chat_id, role=Role.user, content=content, lang=Lang.en),
+                        Message(chat_id=chat_id, role=Role.assistant, content=reply, model="fake", lang=Lang.en)])
+            await db.commit()
+            chat = await db.scalar(select(Chat).options(selectinload(Chat.summary)).where(Chat.id == chat_id))
+            if strategy == "every-turn":
+                await every_turn(db, chat, prov, Lang.en, content, reply)
+                calls += 1
+            else:
+                calls += await summarize_chat(db, chat, prov, Lang.en)
+            await db.commit()
+
+        if (turn + 1) % args.check_every == 0 or turn + 1 == args.turns:
+            async with AsyncSessionLocal() as db:
+                chat = await db.scalar(select(Chat).options(selectinload(Chat.summary)).where(Chat.id == chat_id))
+                messages = await build_context(db, chat, "What do you remember?", Lang.en, "fake")
+            known = set(FACT.findall("\n".join(m["content"] for m in messages)))
+            recalls.append(len(known) / (turn + 1))
+            context_tokens.append(sum(estimate_tokens(m["content"]) for m in messages))
+
+    row = {
+        "calls": calls,
+        "calls_per_turn": calls / args.turns,
+        "mean_recall": statistics.fmean(recalls),
+        "final_recall": recalls[-1],
+        "context_tokens": statistics.fmean(context_tokens),
+    }
+    if isinstance(prov, Extractive):
+        assert prov.calls - calls_before == calls
+        row["summarizer_tokens_per_turn"] = (prov.prompt_tokens - prompt_before) / args.turns
+    return row
+
+
+async def main_async(args):
+    from app.ai.router import provider_from_name
+    from app.db.migrate import migrate
+    from app.db.session import async_engine, engine
+
+    migrate(engine)
+    prov = Extractive(args.summary_facts) if args.provider == "extractive" else provider_from_name(args.provider)
+    rows = {strategy: await run(args, strategy, prov) for strategy in ("every-turn", "threshold")}
+    await async_engine.dispose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_summary")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--user-words", type=int, default=20)
+    parser.add_argument("--reply-words", type=int, default=120)
+    parser.add_argument("--check-every", type=int, default=10)
+    parser.add_argument("--summary-facts", type=int, default=15, help="most facts one extractive summary keeps")
+    parser.add_argument("--budget", type=int, default=4000, help="context token budget")
+    parser.add_argument("--provider", default="extractive", help="or a vendor name, needs its API key")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    keys = {k: os.environ.get(k, "") for k in ("GEMINI_API_KEY", "GROQ_API_KEY", "MISTRAL_API_KEY")}
+    use_fake_backend(CONTEXT_TOKEN_BUDGET=args.budget, CONTEXT_TOKEN_BUDGETS="",
+                     **(keys if args.provider != "extractive" else {}))
+    from app.core.config import get_settings
+
+    s = get_settings()
+    print(f"{args.turns} turns, trigger {s.SUMMARY_TRIGGER_TOKENS} tokens, keep {s.SUMMARY_KEEP_TOKENS}, "
+          f"max {s.SUMMARY_MAX_SEGMENTS} segments, context budget {args.budget}, summarizer {args.provider}")
+    rows = asyncio.run(main_async(args))
+    print(f"{'policy':<12} {'calls':>6} {'calls/turn':>11} {'recall':>8} {'final':>7} {'ctx tokens':>11} {'sum tok/turn':>13}")
+    for name, r in rows.items():
+        print(f"{name:<12} {r['calls']:>6} {r['calls_per_turn']:>11.2f} {r['mean_recall']:>8.1%} {r['final_recall']:>7.1%} "
+              f"{r['context_tokens']:>11.0f} {r.get('summarizer_tokens_per_turn', float('nan')):>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Shared bits of the bench scripts."""
+import json
+import os
+import statistics
+import tempfile
+
+
+def use_fake_backend(**env):
+    """Point the app at a throwaway SQLite file and the fake provider. Call before importing app.*"""
+    d = tempfile.mkdtemp(prefix="bench-")
+    defaults = {
+        "DATABASE_URL": f"sqlite:///{d}/bench.db",
+        "FAKE_PROVIDER_ENABLED": "true",
+        "PROVIDER_ORDER": "fake",
+        "GEMINI_API_KEY": "",
+        "GROQ_API_KEY": "",
+        "Mistral_API_KEY": "",
+        "PROFILE_SUMMARY_INTERVAL_SECONDS": "0",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    for k, v in {**defaults, **env}.items():
+        os.environ[k] = str(v)
+    return d
+
+
+def percentile(sorted_samples: list[float], p: float) -> float:
+    if not sorted_samples:
+        return float("nan")
+    k = (len(sorted_samples) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def summarize(samples: list[float], elapsed: float, errors: int = 0) -> dict:
+    s = sorted(samples)
+    return {
+        "n": len(s),
+        "errors": errors,
+        "rps": len(s) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(s) * 1000 if s else float("nan"),
+        "p50_ms": percentile(s, 50) * 1000,
+        "p95_ms": percentile(s, 95) * 1000,
+        "p99_ms": percentile(s, 99) * 1000,
+    }
+
+
+def print_table(rows: dict[str, dict], unit: str = "ms"):
+    scale = 1000 if unit == "us" else 1
+    print(f"{'name':<26} {'n':>7} {'err':>5} {'ops/s':>10} {'p50 ' + unit:>9} {'p95 ' + unit:>9} {'p99 ' + unit:>9}")
+    for name, r in rows.items():
+        print(f"{name:<26} {r['n']:>7} {r['errors']:>5} {r['rps']:>10.1f} "
+              f"{r['p50_ms'] * scale:>9.2f} {r['p95_ms'] * scale:>9.2f} {r['p99_ms'] * scale:>9.2f}")
+
+
+def write_json(path: str | None, rows: dict[str, dict], **meta):
+    # a baseline to diff the next run against
+    if path:
+        with open(path, "w") as f:
+            json.dump({"meta": meta, "results": rows}, f, indent=2)
@@ -40,6 +40,12 @@ export interface ChatSummaryOut {
   model?: AIModel;
 }
 
+// GET /chats is paginated, pass next_before_id as before_id for the next (older) page
+export interface ChatListOut {
+  items: ChatSummaryOut[];
+  next_before_id?: number | null;
+}
+
 export interface ChatDetailOut {
   id: number;
   title?: string;
@@ -52,6 +58,8 @@ export interface ChatDetailOut {
     model?: AIModel;
     lang?: Lang;
   }>;
+  // messages are oldest first, this pages further back
+  next_before_id?: number | null;
 }
 
 
@@ -26,6 +26,9 @@ const Chat = () => {
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [selectedModel, setSelectedModel] = useState<AIModel>('gemini');
+  // a chat opens on its latest messages, older ones are fetched a page at a time from this id back
+  const [olderBeforeId, setOlderBeforeId] = useState<number | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const { toast } = useToast();
   const chatId = useMemo(() => params.chatId, [params.chatId]);
 
@@ -76,22 +79,26 @@ const Chat = () => {
     navigate('/chat');
   };
 
+  const toMessages = (res: ChatDetailOut): ChatMessage[] =>
+    (res.messages || []).map((m) => ({
+      id: String(m.id),
+      role: m.role,
+      content: m.content,
+      timestamp: m.timestamp || new Date().toISOString(),
+      model: m.model,
+    }));
+
   useEffect(() => {
     const load = async () => {
+      setOlderBeforeId(null);
       if (!chatId) {
         setMessages([]);
         return;
       }
       try {
         const res: ChatDetailOut = await chatApi.getChat(chatId);
-        const msgs: ChatMessage[] = (res.messages || []).map((m) => ({
-          id: String(m.id),
-          role: m.role,
-          content: m.content,
-          timestamp: m.timestamp || new Date().toISOString(),
-          model: m.model,
-        }));
-        setMessages(msgs);
+        setMessages(toMessages(res));
+        setOlderBeforeId(res.next_before_id ?? null);
         if (res.model) setSelectedModel(res.model as AIModel);
       } catch {
         setMessages([]);
@@ -100,6 +107,21 @@ const Chat = () => {
     load();
   }, [chatId]);
 
+  const handleLoadOlder = async () => {
+    if (!chatId || !olderBeforeId) return;
+    setLoadingOlder(true);
+    try {
+      const res: ChatDetailOut = await chatApi.getChat(chatId, olderBeforeId);
+      setMessages(prev => [...toMessages(res), ...prev]);
+      setOlderBeforeId(res.next_before_id ?? null);
+    } catch (error: unknown) {
+      const message = error instanceof Error ? error.message : t.chat.error;
+      toast({ variant: 'destructive', description: message });
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   return (
     <div className="min-h-screen flex flex-col" dir={language === 'ar' ? 'rtl' : 'ltr'}>
       <Navbar />
@@ -147,6 +169,13 @@ const Chat = () => {
               </div>
             ) : (
               <div className="max-w-4xl mx-auto space-y-6">
+                {olderBeforeId && (
+                  <div className="text-center">
+                    <Button variant="outline" onClick={handleLoadOlder} disabled={loadingOlder}>
+                      {loadingOlder ? <Loader2 className="h-4 w-4 animate-spin" /> : t.chat.loadEarlier}
+                    </Button>
+                  </div>
+                )}
                 {messages.map((message, index) => (
                   <div
                     key={message.id}
@@ -6,6 +6,7 @@ import { useNavigate } from 'react-router-dom';
 import { Search, MessageSquare, Trash2 } from 'lucide-react';
 import Navbar from '@/components/Navbar';
 import type { Conversation } from '@/api/schemas/chat';
+import type { ChatSummaryOut } from '@/api/schemas/backend';
 import { chatApi } from '@/services/api';
 import { useToast } from '@/hooks/use-toast';
 
@@ -15,21 +16,27 @@ const History = () => {
   const [searchQuery, setSearchQuery] = useState('');
   const [conversations, setConversations] = useState<Conversation[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
+  // the list comes a page at a time. the next one starts after the last chat still listed, the one the
+  // server pointed at (next_before_id) may have been deleted since
+  const [hasMore, setHasMore] = useState<boolean>(false);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const { toast } = useToast();
 
+  const toConversation = (c: ChatSummaryOut): Conversation => ({
+    id: String(c.id),
+    title: c.title || 'Chat',
+    messages: [],
+    createdAt: c.created_at || new Date().toISOString(),
+    updatedAt: c.updated_at || c.created_at || new Date().toISOString(),
+    model: (c.model as 'gemini' | 'groq' | 'mistral' | undefined) ?? 'gemini',
+  });
+
   useEffect(() => {
     const load = async () => {
       try {
-        const { items } = await chatApi.listChats();
-        const mapped: Conversation[] = (items || []).map((c) => ({
-          id: String(c.id),
-          title: c.title || 'Chat',
-          messages: [],
-          createdAt: c.created_at || new Date().toISOString(),
-          updatedAt: c.updated_at || c.created_at || new Date().toISOString(),
-          model: (c.model as 'gemini' | 'groq' | 'mistral' | undefined) ?? 'gemini',
-        }));
-        setConversations(mapped);
+        const { items, next_before_id } = await chatApi.listChats();
+        setConversations((items || []).map(toConversation));
+        setHasMore(next_before_id != null);
       } finally {
         setLoading(false);
       }
@@ -37,6 +44,22 @@ const History = () => {
     load();
   }, []);
 
+  const handleLoadMore = async () => {
+    const last = conversations[conversations.length - 1];
+    if (!last) return;
+    setLoadingMore(true);
+    try {
+      const { items, next_before_id } = await chatApi.listChats(Number(last.id));
+      setConversations(prev => [...prev, ...(items || []).map(toConversation)]);
+      setHasMore(next_before_id != null);
+    } catch (error: unknown) {
+      const message = error instanceof Error ? error.message : 'Failed to load chats';
+      toast({ variant: 'destructive', description: message });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDelete = async (e: React.MouseEvent, id: string) => {
     e.stopPropagation();
     const previous = conversations;
@@ -125,6 +148,14 @@ const History = () => {
               ))}
             </div>
           )}
+
+          {!loading && hasMore && conversations.length > 0 && (
+            <div className="text-center mt-6">
+              <Button variant="outline" onClick={handleLoadMore} disabled={loadingMore}>
+                {loadingMore ? t.common.loading : t.history.loadMore}
+              </Button>
+            </div>
+          )}
         </div>
       </div>
     </div>
@@ -1,4 +1,4 @@
-import type { AIModel, SendMessageIn, SendMessageOut, ChatDetailOut, ChatSummaryOut } from '@/api/schemas/backend';
+import type { AIModel, SendMessageIn, SendMessageOut, ChatDetailOut, ChatListOut } from '@/api/schemas/backend';
 
 import type {
   LoginRequest,
@@ -94,9 +94,9 @@ export const authApi = {
 // ============= Chat API =============
 
 export const chatApi = {
-  // GET /chats - list user chats
-  listChats: async (): Promise<{ items: ChatSummaryOut[] }> => {
-    return apiRequest<{ items: ChatSummaryOut[] }>('/chats');
+  // GET /chats - list user chats, newest first. one page, pass next_before_id back for the next one
+  listChats: async (beforeId?: number | null): Promise<ChatListOut> => {
+    return apiRequest<ChatListOut>(beforeId ? `/chats?before_id=${beforeId}` : '/chats');
   },
 
   // POST /chats - create chat (title optional)
@@ -107,9 +107,9 @@ export const chatApi = {
     });
   },
 
-  // GET /chats/{chat_id} - get chat details
-  getChat: async (chatId: string | number): Promise<ChatDetailOut> => {
-    return apiRequest<ChatDetailOut>(`/chats/${chatId}`);
+  // GET /chats/{chat_id} - get chat details with the latest messages, next_before_id pages further back
+  getChat: async (chatId: string | number, beforeId?: number | null): Promise<ChatDetailOut> => {
+    return apiRequest<ChatDetailOut>(beforeId ? `/chats/${chatId}?before_id=${beforeId}` : `/chats/${chatId}`);
   },
 
   // DELETE /chats/{chat_id} - delete a chat by id